@@ -0,0 +1,96 @@
+# In-process кэш пользователей для get_current_user.
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+from .metrics import registry
+from .models import User
+
+load_dotenv()
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+
+
+class TTLCache:
+    """Ограниченный LRU-кэш с временем жизни записей и счётчиками попаданий."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+
+user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+
+def get_cached_user(user_id: int) -> Optional[User]:
+    """Вернуть свежую (не привязанную к сессии) копию пользователя из кэша."""
+    data = user_cache.get(user_id)
+    return User(**data) if data is not None else None
+
+
+def cache_user(user: User) -> None:
+    user_cache.set(user.id, user.model_dump())
+
+
+def _user_cache_metrics():
+    stats = user_cache.stats()
+    yield "# HELP user_cache_requests_total get_current_user cache lookups by result"
+    yield "# TYPE user_cache_requests_total counter"
+    yield f'user_cache_requests_total{{result="hit"}} {stats["hits"]}'
+    yield f'user_cache_requests_total{{result="miss"}} {stats["misses"]}'
+    yield "# HELP user_cache_size Users currently cached"
+    yield "# TYPE user_cache_size gauge"
+    yield f"user_cache_size {stats['size']}"
+
+
+registry.add_collector(_user_cache_metrics)
+
+
+# Любая ORM-запись в строку User (verify_email и т.п.) сбрасывает запись кэша
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_user(mapper, connection, target: User) -> None:
+    user_cache.invalidate(target.id)
@@ -1,19 +1,168 @@
 import os
 from dotenv import load_dotenv
-from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel import SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from .logger import logger
+from .metrics import TimedAsyncQueuePool, instrument_engine
+from .query_budget import install_query_counter
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL_TEST") if os.getenv("TESTING") == "1" else os.getenv("DATABASE_URL")
 
-print("DATABASE_URL =", repr(DATABASE_URL))
 
-engine = create_engine(DATABASE_URL, echo=False)
+def to_async_url(url: str) -> str:
+    """Подставить async-драйвер: asyncpg для Postgres, aiosqlite для SQLite."""
+    scheme, sep, rest = url.partition("://")
+    driver = scheme.split("+", 1)[0]
+    if driver in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    return url
+
+
+ASYNC_DATABASE_URL = to_async_url(DATABASE_URL)
+
+# Необязательная реплика для чтения (GET-эндпоинты, см. app/replicas.py)
+DATABASE_REPLICA_URL = None if os.getenv("TESTING") == "1" else os.getenv("DATABASE_REPLICA_URL")
+ASYNC_REPLICA_URL = to_async_url(DATABASE_REPLICA_URL) if DATABASE_REPLICA_URL else None
+
+# ---- Пул соединений (из env) ----
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Сколько ждать свободное соединение, прежде чем отдать 503
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+# Пересоздавать соединения старше N секунд (-1 — никогда)
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Серверный statement_timeout Postgres, мс (0 — без ограничения)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+
+def engine_options(url: str) -> dict:
+    """Параметры пула и таймаута запросов для create_engine/create_async_engine."""
+    url = make_url(url)
+    backend, driver = url.get_backend_name(), url.get_driver_name()
+    if backend == "sqlite" and url.database in (None, "", ":memory:"):
+        # In-memory SQLite живёт в одном соединении (StaticPool), пул не настраивается
+        return {}
+
+    options = {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if backend == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+        if driver == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+# Автосоздание таблиц через create_all при старте — для разработки и тестов.
+# В production схемой управляет Alembic: DB_CREATE_ALL=0
+DB_CREATE_ALL = os.getenv("DB_CREATE_ALL", "1") == "1"
+
+# Движки создаются лениво, в процессе воркера (после fork), а не при импорте:
+# иначе pre-fork сервер раздаёт воркерам одни и те же сокеты пула
+async_engine = None
+replica_engine = None
+_engines_pid = None
+
+# Привязка к движку появляется в init_engines()
+async_session_maker = async_sessionmaker(class_=AsyncSession, expire_on_commit=False)
+# Без реплики привязан к тому же основному движку
+replica_session_maker = async_sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+
+def create_sync_engine():
+    """Синхронный движок для служебных скриптов (импорт, миграции данных)."""
+    sync_engine = create_engine(DATABASE_URL, echo=False, **engine_options(DATABASE_URL))
+    instrument_engine(sync_engine)
+    install_query_counter(sync_engine)
+    return sync_engine
 
-def init_db():
+
+def _create_async_engine(url: str):
+    options = engine_options(url)
+    if options:
+        # Пул с замером ожидания checkout
+        options["poolclass"] = TimedAsyncQueuePool
+    new_engine = create_async_engine(url, echo=False, **options)
+    instrument_engine(new_engine)
+    install_query_counter(new_engine)
+    return new_engine
+
+
+def init_engines():
+    """Создать асинхронные движки в текущем процессе и привязать к ним сессии."""
+    global async_engine, replica_engine, _engines_pid
+    if async_engine is not None and _engines_pid == os.getpid():
+        return async_engine
+    # Движки, унаследованные от родителя через fork: их соединения не трогаем
+    for inherited in (async_engine, replica_engine):
+        if inherited is not None:
+            inherited.sync_engine.dispose(close=False)
+
+    async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+    async_session_maker.configure(bind=async_engine)
+    replica_engine = _create_async_engine(ASYNC_REPLICA_URL) if ASYNC_REPLICA_URL else None
+    replica_session_maker.configure(bind=replica_engine or async_engine)
+    _engines_pid = os.getpid()
+    logger.info("База данных: %s (pid %s)", async_engine.url.render_as_string(hide_password=True), _engines_pid)
+    if replica_engine is not None:
+        logger.info("Реплика для чтения: %s", replica_engine.url.render_as_string(hide_password=True))
+    return async_engine
+
+
+async def dispose_engines():
+    global async_engine, replica_engine, _engines_pid
+    for current in (async_engine, replica_engine):
+        if current is not None:
+            await current.dispose()
+    async_engine = replica_engine = _engines_pid = None
+
+
+def pool_status(engine=None) -> dict:
+    """Текущая загрузка пула асинхронного движка."""
+    engine = engine or async_engine
+    if engine is None:
+        return {"pool": None}
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "capacity": pool.size() + DB_MAX_OVERFLOW,
+        "timeout": DB_POOL_TIMEOUT,
+    }
+
+
+async def init_db():
     from .models import User, Duel
-    SQLModel.metadata.create_all(engine)
+    async with async_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+
+
+async def check_db() -> None:
+    """Один SELECT 1 — для проверки готовности."""
+    async with async_engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
 
-def get_session():
-    with Session(engine) as session:
-        yield session
\ No newline at end of file
+async def get_session():
+    async with async_session_maker() as session:
+        yield session
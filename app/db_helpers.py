@@ -0,0 +1,90 @@
+# Общие запросы к БД: UPSERT счётчиков статистики и вставка пользователя.
+from typing import Dict, List
+
+from sqlalchemy import insert, select as sa_select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import Statistics, User
+
+STATISTICS_COUNTERS = ("games", "games_won", "duels", "duels_won")
+
+
+def dialect_insert(bind):
+    """insert() с поддержкой ON CONFLICT для диалекта сессии, соединения или движка."""
+    dialect = getattr(bind, "dialect", None) or bind.bind.dialect
+    if dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def statistics_upsert(session: AsyncSession, rows: List[Dict[str, int]]):
+    """Многострочный INSERT ... ON CONFLICT (user_id) DO UPDATE SET col = col + excluded.col.
+
+    rows — словари с user_id и приращениями всех счётчиков STATISTICS_COUNTERS.
+    Каждое обновление увеличивает version строки (ETag GET /statistics).
+    """
+    insert = dialect_insert(session)
+    stmt = insert(Statistics).values(rows)
+    set_ = {col: getattr(Statistics, col) + getattr(stmt.excluded, col) for col in STATISTICS_COUNTERS}
+    set_["version"] = Statistics.version + 1
+    return stmt.on_conflict_do_update(index_elements=[Statistics.user_id], set_=set_)
+
+
+async def increment_statistics(session: AsyncSession, user_id: int,
+                               commit: bool = True, **deltas: int) -> Statistics:
+    """Атомарно прибавить счётчики статистики одним запросом.
+
+    INSERT ... ON CONFLICT (user_id) DO UPDATE SET col = col + :delta RETURNING —
+    без чтения строки в Python, поэтому параллельные игры не теряют инкременты,
+    а отсутствующая строка создаётся на лету. С commit=False запрос остаётся
+    частью текущей транзакции вызывающего.
+    """
+    values = {col: deltas.get(col, 0) for col in STATISTICS_COUNTERS}
+    stmt = statistics_upsert(session, [{"user_id": user_id, **values}]).returning(
+        *(getattr(Statistics, col) for col in STATISTICS_COUNTERS), Statistics.version
+    )
+
+    row = (await session.exec(stmt)).one()
+    if commit:
+        await session.commit()
+    return Statistics(user_id=user_id, **row._mapping)
+
+
+async def increment_statistics_many(session: AsyncSession,
+                                    deltas: Dict[int, Dict[str, int]]) -> List[Statistics]:
+    """Прибавить счётчики нескольким пользователям одним многострочным UPSERT.
+
+    deltas — {user_id: {счётчик: приращение}}. Строки идут по возрастанию
+    user_id, чтобы параллельные транзакции брали блокировки в одном порядке.
+    Коммит остаётся за вызывающим.
+    """
+    rows = [
+        {"user_id": user_id, **{col: values.get(col, 0) for col in STATISTICS_COUNTERS}}
+        for user_id, values in sorted(deltas.items())
+    ]
+    stmt = statistics_upsert(session, rows).returning(
+        Statistics.user_id, *(getattr(Statistics, col) for col in STATISTICS_COUNTERS), Statistics.version
+    )
+    return [Statistics(**row._mapping) for row in (await session.exec(stmt)).all()]
+
+
+async def create_user_with_statistics(session: AsyncSession, **user_values) -> int:
+    """Вставить пользователя и его пустую статистику, вернуть id пользователя.
+
+    На Postgres это один запрос (INSERT ... RETURNING в CTE), на SQLite —
+    два INSERT в одной транзакции. Коммит остаётся за вызывающим;
+    занятый email приводит к IntegrityError.
+    """
+    if session.bind.dialect.name == "postgresql":
+        new_user = insert(User).values(**user_values).returning(User.id).cte("new_user")
+        stmt = insert(Statistics).from_select(
+            ["user_id"], sa_select(new_user.c.id)
+        ).returning(Statistics.user_id)
+    else:
+        user_id = (await session.exec(
+            insert(User).values(**user_values).returning(User.id)
+        )).scalar_one()
+        stmt = insert(Statistics).values(user_id=user_id).returning(Statistics.user_id)
+    return (await session.exec(stmt)).scalar_one()
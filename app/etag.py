@@ -0,0 +1,71 @@
+# ETag и условные GET (If-None-Match -> 304) на основе версий данных.
+from typing import Optional
+
+from fastapi import Request, Response, status
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .models import TableVersion
+from .db_helpers import dialect_insert
+
+# Имя счётчика изменений таблицы duel
+DUELS_VERSION = "duel"
+
+
+def make_etag(*parts) -> str:
+    """Слабый ETag из частей версии: тело может отличаться сжатием, смысл — нет."""
+    return 'W/"' + "-".join(str(part) for part in parts) + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """Совпадает ли ETag с одним из значений If-None-Match (слабое сравнение)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in header.split(","))
+
+
+def set_etag(response: Response, etag: str, cache_control: str = "no-cache") -> None:
+    # no-cache: клиент хранит ответ, но каждый раз перепроверяет его по ETag
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control
+
+
+def not_modified(request: Request, response: Response, etag: str,
+                 cache_control: str = "no-cache") -> Optional[Response]:
+    """Ответ 304, если у клиента актуальная версия; иначе ETag проставляется в response.
+
+    Обработчик вызывает это до тяжёлой части (выборки и сериализации):
+
+        cached = not_modified(request, response, etag)
+        if cached is not None:
+            return cached
+    """
+    if etag_matches(request, etag):
+        cached = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        set_etag(cached, etag, cache_control)
+        return cached
+    set_etag(response, etag, cache_control)
+    return None
+
+
+async def table_version(session: AsyncSession, name: str) -> int:
+    version = (await session.exec(select(TableVersion.version).where(TableVersion.name == name))).first()
+    return version or 0
+
+
+async def bump_table_version(session: AsyncSession, name: str) -> None:
+    """Увеличить счётчик изменений таблицы в текущей транзакции.
+
+    Вызывать последним запросом перед commit: на Postgres строка счётчика
+    остаётся заблокированной до конца транзакции.
+    """
+    insert = dialect_insert(session)
+    stmt = insert(TableVersion).values(name=name, version=1)
+    await session.exec(stmt.on_conflict_do_update(
+        index_elements=[TableVersion.name],
+        set_={"version": TableVersion.version + 1},
+    ))
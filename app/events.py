@@ -0,0 +1,120 @@
+# События дуэлей (created/joined/deleted) для push-подписчиков.
+import asyncio
+import json
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Set
+
+from dotenv import load_dotenv
+
+from .logger import logger
+
+load_dotenv()
+
+# memory — один процесс (и тесты), postgres — рассылка между воркерами через LISTEN/NOTIFY
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "memory")
+# Сколько событий может ждать медленный подписчик, старые вытесняются
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "100"))
+
+LOBBY_CHANNEL = "lobby"
+
+
+def duel_channel(duel_id: int) -> str:
+    return f"duel:{duel_id}"
+
+
+class InMemoryBroker:
+    """Рассылка событий подписчикам внутри одного процесса."""
+
+    def __init__(self, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        self._deliver(channel, event)
+
+    def _deliver(self, channel: str, event: Dict[str, Any]) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        """Очередь событий канала на время подписки."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+
+class PostgresBroker(InMemoryBroker):
+    """События публикуются через pg_notify и доставляются всем воркерам по LISTEN."""
+
+    def __init__(self, dsn: str, pg_channel: str = "duel_events", **kwargs):
+        super().__init__(**kwargs)
+        self.dsn = dsn
+        self.pg_channel = pg_channel
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        import asyncpg
+
+        self._conn = await asyncpg.connect(self.dsn)
+        await self._conn.add_listener(self.pg_channel, self._on_notify)
+
+    async def stop(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        payload = json.dumps({"channel": channel, "event": event})
+        # Одно соединение asyncpg не допускает параллельных запросов
+        async with self._lock:
+            await self._conn.execute("SELECT pg_notify($1, $2)", self.pg_channel, payload)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        try:
+            data = json.loads(payload)
+        except ValueError:
+            logger.warning("Некорректное событие из %s: %r", channel, payload)
+            return
+        self._deliver(data["channel"], data["event"])
+
+
+def create_broker() -> InMemoryBroker:
+    if EVENTS_BROKER == "postgres":
+        from .database import DATABASE_URL
+
+        scheme, sep, rest = DATABASE_URL.partition("://")
+        return PostgresBroker(f"postgresql{sep}{rest}")
+    return InMemoryBroker()
+
+
+broker = create_broker()
+
+
+async def publish_duel_event(event_type: str, duel: Any, lobby: bool = True) -> None:
+    """Отправить событие дуэли в её канал и (по умолчанию) в лобби."""
+    event = {"type": event_type, "duel": duel.model_dump(mode="json")}
+    try:
+        await broker.publish(duel_channel(duel.id), event)
+        if lobby:
+            await broker.publish(LOBBY_CHANNEL, event)
+    except Exception as e:
+        # Потеря push-события не должна ломать сам запрос
+        logger.error("Не удалось опубликовать событие %s для дуэли %s: %s", event_type, duel.id, e)
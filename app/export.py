@@ -0,0 +1,128 @@
+"""Потоковая выгрузка статистики и дуэлей (duel и duel_history, с email игроков) в NDJSON или CSV.
+
+    python -m app.export statistics --format csv --out statistics.csv
+    python -m app.export duels --out duels.ndjson
+
+Строки читаются серверным курсором пачками по EXPORT_BATCH_SIZE
+(AsyncSession.stream + yield_per), поэтому память не зависит от размера
+таблицы. Тот же генератор отдаёт GET /admin/export/{table}.
+"""
+import argparse
+import asyncio
+import csv
+import io
+import os
+import sys
+from typing import AsyncIterator, Dict, Literal
+
+import orjson
+from dotenv import load_dotenv
+from sqlalchemy import DateTime, null, select, union_all
+from sqlalchemy.orm import aliased
+
+from . import database
+from .models import Duel, DuelHistory, Statistics, User
+from .replicas import read_session_maker, replica_monitor
+
+load_dotenv()
+
+# Строк в одной пачке курсора и в одном куске ответа
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+
+ExportTable = Literal["statistics", "duels"]
+ExportFormat = Literal["ndjson", "csv"]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv; charset=utf-8"}
+
+_creator = aliased(User)
+_joiner = aliased(User)
+
+
+def _duels_select(table, archived_at):
+    """Дуэли из duel или duel_history с email игроков; archived_at — NULL для живых."""
+    return (
+        select(
+            table.id, table.creator_id, _creator.email.label("creator_email"),
+            table.join_id, _joiner.email.label("join_email"), table.winner_id,
+            table.status, table.created_at, table.joined_at, table.finished_at,
+            archived_at.label("archived_at"),
+        )
+        # В duel_history нет внешних ключей: пользователь мог быть удалён
+        .outerjoin(_creator, _creator.id == table.creator_id)
+        .outerjoin(_joiner, _joiner.id == table.join_id)
+    )
+
+
+_all_duels = union_all(
+    _duels_select(Duel, null().cast(DateTime)),
+    _duels_select(DuelHistory, DuelHistory.archived_at),
+).subquery("all_duels")
+
+EXPORTS: Dict[str, object] = {
+    "statistics": (
+        select(
+            Statistics.user_id, User.email, Statistics.games, Statistics.games_won,
+            Statistics.duels, Statistics.duels_won,
+        )
+        .join(User, User.id == Statistics.user_id)
+        .order_by(Statistics.user_id)
+    ),
+    # Уборщик переносит старые дуэли в duel_history — выгрузка отдаёт обе таблицы
+    "duels": select(_all_duels).order_by(_all_duels.c.id),
+}
+
+
+async def export_chunks(table: ExportTable, fmt: ExportFormat,
+                        batch_size: int = EXPORT_BATCH_SIZE) -> AsyncIterator[bytes]:
+    """Куски выгрузки по одному на пачку строк; следующая пачка читается, когда забрали предыдущую."""
+    statement = EXPORTS[table].execution_options(yield_per=batch_size)
+    # Выгрузка долгая и только читает — реплика, если она есть и не отстаёт
+    async with read_session_maker()() as session:
+        result = await session.stream(statement)
+        columns = list(result.keys())
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        async for partition in result.partitions():
+            if fmt == "ndjson":
+                yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in partition)
+            else:
+                writer.writerows(partition)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+        if fmt == "csv" and buffer.tell():
+            # Заголовок пустой таблицы
+            yield buffer.getvalue().encode("utf-8")
+
+
+async def export_to_file(table: ExportTable, fmt: ExportFormat, out) -> int:
+    database.init_engines()
+    written = 0
+    try:
+        if database.replica_engine is not None:
+            await replica_monitor.check()
+        async for chunk in export_chunks(table, fmt):
+            out.write(chunk)
+            written += len(chunk)
+    finally:
+        await database.dispose_engines()
+    return written
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Выгрузка статистики и дуэлей в NDJSON/CSV")
+    parser.add_argument("table", choices=list(EXPORTS))
+    parser.add_argument("--format", choices=list(MEDIA_TYPES), default="ndjson")
+    parser.add_argument("--out", required=True, help="файл для выгрузки")
+    args = parser.parse_args(argv)
+
+    with open(args.out, "wb") as out:
+        written = asyncio.run(export_to_file(args.table, args.format, out))
+    print(f"Готово: {written} байт", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Массовый импорт пользователей и их статистики из CSV или NDJSON.
+
+    python -m app.import_users users.csv
+    python -m app.import_users users.ndjson --batch-size 2000
+
+Поля записи: email, hashed_password (готовый хэш passlib) или password
+(будет захэширован), необязательные is_verified, games, games_won, duels,
+duels_won. Email проверяется и нормализуется так же, как в /auth/register;
+записи без email или пароля, с неверным email или счётчиками пропускаются
+с сообщением в stderr. Уже существующие email пропускаются (и не хэшируются
+заново), поэтому импорт можно безопасно перезапустить.
+"""
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+from sqlmodel import select
+
+from app.database import create_sync_engine
+from app.models import User, Statistics
+from app.db_helpers import STATISTICS_COUNTERS, dialect_insert
+from app.utils import hash_password
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+# Тот же валидатор, что у UserCreate.email: домен приводится к нижнему регистру
+_email_adapter = TypeAdapter(EmailStr)
+
+
+def read_records(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def _as_bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    return str(value or "").strip().lower() in TRUE_VALUES
+
+
+def normalize_record(record: Dict) -> Dict:
+    """Проверенная запись: email, hashed_password или password, is_verified, счётчики.
+
+    Неполная или некорректная запись — ValueError с причиной.
+    """
+    raw_email = str(record.get("email") or "").strip()
+    if not raw_email:
+        raise ValueError("нет email")
+    try:
+        email = _email_adapter.validate_python(raw_email)
+    except ValidationError:
+        raise ValueError(f"неверный email {raw_email!r}") from None
+
+    normalized = {"email": email, "is_verified": _as_bool(record.get("is_verified"))}
+    if record.get("hashed_password"):
+        normalized["hashed_password"] = record["hashed_password"]
+    elif record.get("password"):
+        normalized["password"] = str(record["password"])
+    else:
+        raise ValueError(f"нет password или hashed_password для {email}")
+
+    for col in STATISTICS_COUNTERS:
+        try:
+            value = int(record.get(col) or 0)
+        except (TypeError, ValueError):
+            raise ValueError(f"{col} не число для {email}") from None
+        if value < 0:
+            raise ValueError(f"{col} меньше нуля для {email}")
+        normalized[col] = value
+    return normalized
+
+
+def valid_records(records: Iterable[Dict], on_error: Callable[[int, str], None]) -> Iterator[Dict]:
+    """Нормализованные записи; о пропущенных сообщается on_error(номер записи, причина)."""
+    for number, record in enumerate(records, 1):
+        try:
+            yield normalize_record(record)
+        except ValueError as e:
+            on_error(number, str(e))
+
+
+def batches(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_batch(conn, batch: List[Dict], pool: ProcessPoolExecutor) -> int:
+    """Вставить пачку нормализованных записей и их статистику, вернуть число новых пользователей."""
+    by_email = {r["email"]: r for r in batch}
+    existing = set(conn.execute(select(User.email).where(User.email.in_(list(by_email)))).scalars())
+    new = {email: r for email, r in by_email.items() if email not in existing}
+    if not new:
+        return 0
+
+    # Хэширование pbkdf2 — самая дорогая часть: только новые пользователи, по всем ядрам
+    to_hash = [r for r in new.values() if not r.get("hashed_password")]
+    if to_hash:
+        hashed = pool.map(hash_password, [r["password"] for r in to_hash], chunksize=32)
+        for record, value in zip(to_hash, hashed):
+            record["hashed_password"] = value
+
+    insert = dialect_insert(conn)
+    # executemany: один подготовленный INSERT на всю пачку
+    users = [
+        {"email": email, "hashed_password": r["hashed_password"], "is_verified": r["is_verified"]}
+        for email, r in new.items()
+    ]
+    conn.execute(insert(User).on_conflict_do_nothing(index_elements=[User.email]), users)
+
+    ids = conn.execute(select(User.id, User.email).where(User.email.in_(list(new)))).all()
+    stats = [
+        {"user_id": user_id, **{col: new[email][col] for col in STATISTICS_COUNTERS}}
+        for user_id, email in ids
+    ]
+    conn.execute(insert(Statistics).on_conflict_do_nothing(index_elements=[Statistics.user_id]), stats)
+    return len(new)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Импорт пользователей из CSV/NDJSON")
+    parser.add_argument("path", help="файл .csv или .ndjson/.jsonl")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    skipped = 0
+
+    def report(number: int, reason: str) -> None:
+        nonlocal skipped
+        skipped += 1
+        print(f"Запись {number} пропущена: {reason}", file=sys.stderr)
+
+    engine = create_sync_engine()
+    total = created = 0
+    with ProcessPoolExecutor() as pool:
+        for batch in batches(valid_records(read_records(args.path), report), args.batch_size):
+            # Каждая пачка — отдельная транзакция
+            with engine.begin() as conn:
+                created += import_batch(conn, batch, pool)
+            total += len(batch)
+            print(f"Обработано записей: {total}, создано пользователей: {created}", file=sys.stderr)
+
+    print(f"Готово: {created} новых пользователей из {total} записей, пропущено некорректных: {skipped}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+# Лидерборды по таблице Statistics, поддерживаемые в памяти процесса.
+import asyncio
+import os
+from bisect import bisect_left, insort
+from typing import Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlmodel import select
+
+from .database import async_session_maker
+from .logger import logger
+from .models import Statistics
+
+load_dotenv()
+
+# Минимум игр для попадания в рейтинг по доле побед
+LEADERBOARD_MIN_GAMES = int(os.getenv("LEADERBOARD_MIN_GAMES", "10"))
+# Период полной пересборки из БД, секунды: подтягивает изменения других воркеров.
+# Между пересборками лидерборды живут инкрементальными обновлениями; 0 — только при старте
+LEADERBOARD_REFRESH = float(os.getenv("LEADERBOARD_REFRESH", "900"))
+# Строк статистики в одной пачке серверного курсора при пересборке
+LEADERBOARD_LOAD_BATCH = int(os.getenv("LEADERBOARD_LOAD_BATCH", "5000"))
+
+# Только колонки, из которых строятся ключи лидербордов
+_LOAD_COLUMNS = (Statistics.user_id, Statistics.games, Statistics.games_won, Statistics.duels_won)
+
+Key = Tuple
+
+
+class Leaderboard:
+    """Отсортированный список ключей (-score, ..., user_id).
+
+    Место пользователя и страница топа ищутся бинарным поиском — O(log n);
+    обновление — поиск O(log n) плюс сдвиг списка при вставке.
+    """
+
+    def __init__(self, key: Callable[[Statistics], Optional[Key]]):
+        self.key = key
+        self._keys: List[Key] = []
+        self._by_user: Dict[int, Key] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, stats: Statistics) -> None:
+        old = self._by_user.pop(stats.user_id, None)
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+        new = self.key(stats)
+        if new is not None:
+            insort(self._keys, new)
+            self._by_user[stats.user_id] = new
+
+    def load(self, by_user: Dict[int, Key]) -> None:
+        """Заменить содержимое готовыми ключами {user_id: ключ}."""
+        self._keys = sorted(by_user.values())
+        self._by_user = by_user
+
+    def page(self, offset: int, limit: int) -> List[Tuple[int, Key]]:
+        """Пары (место, ключ) начиная с места offset + 1."""
+        return [(offset + i + 1, key) for i, key in enumerate(self._keys[offset:offset + limit])]
+
+    def rank(self, user_id: int) -> Optional[Tuple[int, Key]]:
+        key = self._by_user.get(user_id)
+        if key is None:
+            return None
+        return bisect_left(self._keys, key) + 1, key
+
+
+def key_score(key: Key) -> float:
+    """Очки из ключа сортировки (первый элемент хранится со знаком минус)."""
+    return -key[0]
+
+
+def _games_key(stats: Statistics) -> Key:
+    return (-stats.games_won, stats.user_id)
+
+
+def _duels_key(stats: Statistics) -> Key:
+    return (-stats.duels_won, stats.user_id)
+
+
+def _winrate_key(stats: Statistics) -> Optional[Key]:
+    if stats.games < LEADERBOARD_MIN_GAMES:
+        return None
+    return (-stats.games_won / stats.games, -stats.games_won, stats.user_id)
+
+
+class LeaderboardService:
+    """Набор лидербордов: инкрементальные обновления плюс периодическая пересборка."""
+
+    def __init__(self, session_maker=async_session_maker, refresh: float = LEADERBOARD_REFRESH):
+        self.session_maker = session_maker
+        self.refresh = refresh
+        self.boards: Dict[str, Leaderboard] = {
+            "games": Leaderboard(_games_key),
+            "duels": Leaderboard(_duels_key),
+            "winrate": Leaderboard(_winrate_key),
+        }
+        self._rebuilding: Optional[Dict[int, Statistics]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def update(self, stats: Statistics) -> None:
+        """Учесть новые значения счётчиков пользователя."""
+        for board in self.boards.values():
+            board.update(stats)
+        if self._rebuilding is not None:
+            self._rebuilding[stats.user_id] = stats
+
+    async def rebuild(self) -> None:
+        """Перечитать таблицу statistics и пересобрать лидерборды.
+
+        Читаются только нужные колонки, серверным курсором пачками по
+        LEADERBOARD_LOAD_BATCH; в памяти остаются ключи, а не строки.
+        """
+        self._rebuilding = {}
+        keys: Dict[str, Dict[int, Key]] = {name: {} for name in self.boards}
+        rows = 0
+        try:
+            statement = select(*_LOAD_COLUMNS).execution_options(yield_per=LEADERBOARD_LOAD_BATCH)
+            async with self.session_maker() as session:
+                result = await session.stream(statement)
+                async for partition in result.partitions():
+                    rows += len(partition)
+                    for stats in partition:
+                        for name, board in self.boards.items():
+                            key = board.key(stats)
+                            if key is not None:
+                                keys[name][stats.user_id] = key
+            for name, board in self.boards.items():
+                board.load(keys[name])
+            # Обновления, пришедшие во время чтения, свежее прочитанного
+            for stats in self._rebuilding.values():
+                for board in self.boards.values():
+                    board.update(stats)
+        finally:
+            self._rebuilding = None
+        logger.info("Лидерборды пересобраны: %s строк статистики", rows)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.rebuild()
+                if self.refresh <= 0:
+                    return
+            except Exception as e:
+                logger.error("Ошибка пересборки лидербордов: %s", e)
+            # Без периодической пересборки неудачную стартовую загрузку всё равно повторяем
+            await asyncio.sleep(self.refresh if self.refresh > 0 else 60)
+
+
+leaderboards = LeaderboardService()
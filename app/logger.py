@@ -1,20 +1,148 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
 import sys
 
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# LOG_FORMAT=json — одна JSON-строка на запись, иначе обычный текст
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Уровни отдельных логгеров: "sqlalchemy.engine=WARNING,uvicorn.access=WARNING"
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# Доля INFO-записей, которые пишутся (1.0 — все); WARNING и выше пишутся всегда
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+
+# Bearer/JWT-токены, токены в query string и пароли не должны попадать в лог
+_SECRET_PATTERNS = [
+    (re.compile(r"(Bearer\s+)[A-Za-z0-9\-_\.=]+", re.IGNORECASE), r"\1***"),
+    (re.compile(r"eyJ[A-Za-z0-9\-_]+\.[A-Za-z0-9\-_]+\.[A-Za-z0-9\-_]*"), "***"),
+    (re.compile(r"((?:token|password|access_token)[\"']?\s*[=:]\s*[\"']?)[^\s&\"',}]+", re.IGNORECASE), r"\1***"),
+]
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class RedactingFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return redact(super().format(record))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": redact(record.getMessage()),
+        }
+        if record.exc_info:
+            data["exc_info"] = redact(self.formatException(record.exc_info))
+        return json.dumps(data, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускать только долю rate INFO-записей (extra={"sample": False} — всегда)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.INFO or self.rate >= 1.0:
+            return True
+        if not getattr(record, "sample", True):
+            return True
+        return random.random() < self.rate
+
+
+class ThreadQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler без форматирования и копирования записи в вызывающем потоке.
+
+    Очередь читает поток того же процесса, поэтому запись не нужно готовить
+    к pickle: сообщение собирается из msg % args уже в QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
 # get logger
 logger = logging.getLogger()
 
-formatter = logging.Formatter(
-    fmt="%(asctime)s - %(levelname)s - %(message)s"
-)
+if LOG_FORMAT == "json":
+    formatter = JsonFormatter()
+else:
+    formatter = RedactingFormatter(
+        fmt="%(asctime)s - %(levelname)s - %(message)s"
+    )
 
 stream_handler = logging.StreamHandler(sys.stdout)
-file_handler = logging.FileHandler('app.log', encoding='utf-8')
+file_handler = logging.FileHandler(LOG_FILE, encoding='utf-8')
 
 stream_handler.setFormatter(formatter)
 file_handler.setFormatter(formatter)
 
+# Запросы только кладут запись в очередь; форматирование и запись
+# в stdout/файл выполняет отдельный поток QueueListener
+log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+queue_handler = ThreadQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+
+listener = None
+_listener_pid = None
+
+
+def start_logging() -> None:
+    """Запустить поток записи в текущем процессе (повторный вызов в том же процессе — no-op).
+
+    Поток не переживает fork: воркер, унаследовавший модуль от родителя
+    (gunicorn --preload), заводит свой поток и свою очередь — в копии
+    родительской очереди лежат записи, которые родитель запишет сам.
+    """
+    global listener, _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    if _listener_pid is not None:
+        queue_handler.queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, stream_handler, file_handler, respect_handler_level=True
+    )
+    listener.start()
+    _listener_pid = os.getpid()
+
+
+def stop_logging() -> None:
+    """Дописать оставшиеся в очереди записи и остановить поток записи."""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        listener.stop()
+        _listener_pid = None
+
+
+# Скрипты (импорт, выгрузка, бенчмарки) логируют сразу; воркеры после fork
+# перезапускают поток здесь и ещё раз (no-op) в lifespan
+start_logging()
+os.register_at_fork(after_in_child=start_logging)
+atexit.register(stop_logging)
+
 #handlers
-logger.handlers = [stream_handler, file_handler]
+logger.handlers = [queue_handler]
+
+logger.setLevel(LOG_LEVEL)
 
-logger.setLevel(logging.INFO)
\ No newline at end of file
+for item in filter(None, (part.strip() for part in LOG_LEVELS.split(","))):
+    name, _, level = item.partition("=")
+    logging.getLogger(name.strip()).setLevel(level.strip().upper())
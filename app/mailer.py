@@ -0,0 +1,214 @@
+# Фоновая очередь писем (outbox) с постоянным SMTP-соединением.
+import asyncio
+import os
+import smtplib
+import time
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+from typing import List, Optional
+
+from dotenv import load_dotenv
+
+from .logger import logger
+from .metrics import SMTP_SEND_DURATION, registry
+
+load_dotenv()
+
+# По умолчанию — Gmail; SMTP_HOST задаётся, например, для локального aiosmtpd
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") == "1"
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASS = os.getenv("SMTP_PASS")
+SMTP_FROM = os.getenv("SMTP_FROM", SMTP_USER or "noreply@localhost")
+
+# Сколько писем отправлять за один заход и сколько ждать добора пачки
+SMTP_BATCH_SIZE = int(os.getenv("SMTP_BATCH_SIZE", "20"))
+SMTP_BATCH_WAIT = float(os.getenv("SMTP_BATCH_WAIT", "0.5"))
+# Повторы с экспоненциальной задержкой: base * 2 ** attempt
+SMTP_MAX_ATTEMPTS = int(os.getenv("SMTP_MAX_ATTEMPTS", "5"))
+SMTP_RETRY_BASE = float(os.getenv("SMTP_RETRY_BASE", "2"))
+# Соединение, простоявшее дольше этого, проверяется NOOP перед отправкой
+SMTP_IDLE_CHECK = float(os.getenv("SMTP_IDLE_CHECK", "30"))
+
+
+@dataclass
+class EmailJob:
+    to: str
+    subject: str
+    body: str
+    attempts: int = 0
+
+
+class SMTPOutbox:
+    """Очередь писем: register только кладёт задачу, отправляет фоновый воркер.
+
+    Воркер держит одно авторизованное SMTP-соединение, отправляет письма
+    пачками и повторяет неудачные с экспоненциальной задержкой.
+    """
+
+    def __init__(self, host: Optional[str] = SMTP_HOST, port: int = SMTP_PORT,
+                 user: Optional[str] = SMTP_USER, password: Optional[str] = SMTP_PASS,
+                 sender: str = SMTP_FROM, starttls: bool = SMTP_STARTTLS):
+        # Без явного хоста и без учётных данных Gmail слать некуда
+        self.enabled = bool(host) or bool(user and password)
+        self.host = host or "smtp.gmail.com"
+        self.port = port
+        self.user = user
+        self.password = password
+        self.sender = sender
+        self.starttls = starttls
+        self.queue: "asyncio.Queue[EmailJob]" = asyncio.Queue()
+        self.sent = 0
+        self.failed = 0
+        self._smtp: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._retries: set = set()
+
+    # ---------- Публичный интерфейс ----------
+    def enqueue(self, job: EmailJob) -> None:
+        if not self.enabled:
+            logger.warning("SMTP не настроен, письмо для %s не будет отправлено", job.to)
+            return
+        self.queue.put_nowait(job)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._worker())
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дождаться отправки очереди (не дольше timeout) и закрыть соединение."""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox остановлен, не отправлено писем: %s", self.queue.qsize())
+        if self._retries:
+            logger.warning("Outbox остановлен, отменено повторов: %s", len(self._retries))
+        for task in list(self._retries):
+            task.cancel()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await asyncio.to_thread(self._close)
+
+    # ---------- Воркер ----------
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self.queue.get()]
+            deadline = time.monotonic() + SMTP_BATCH_WAIT
+            while len(batch) < SMTP_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                failed = await asyncio.to_thread(self._send_batch, batch)
+            except Exception as e:
+                logger.error("Ошибка отправки пачки писем: %s", e)
+                failed = batch
+
+            for job in failed:
+                self._retry(job)
+            for _ in batch:
+                self.queue.task_done()
+
+    def _retry(self, job: EmailJob) -> None:
+        job.attempts += 1
+        if job.attempts >= SMTP_MAX_ATTEMPTS:
+            self.failed += 1
+            logger.error("Письмо для %s не отправлено после %s попыток", job.to, job.attempts)
+            return
+        delay = SMTP_RETRY_BASE * 2 ** (job.attempts - 1)
+        logger.warning("Повторная отправка письма для %s через %s с", job.to, delay)
+        task = asyncio.create_task(self._requeue_later(job, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _requeue_later(self, job: EmailJob, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self.queue.put_nowait(job)
+
+    # ---------- SMTP (выполняется в потоке) ----------
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        server.ehlo()
+        if self.starttls:
+            server.starttls()
+            server.ehlo()
+        if self.user and self.password:
+            server.login(self.user, self.password)
+        return server
+
+    def _ensure_connection(self) -> smtplib.SMTP:
+        if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_CHECK:
+            try:
+                self._smtp.noop()
+            except (smtplib.SMTPException, OSError):
+                self._close()
+        if self._smtp is None:
+            self._smtp = self._connect()
+        return self._smtp
+
+    def _close(self) -> None:
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def _send_batch(self, batch: List[EmailJob]) -> List[EmailJob]:
+        """Отправить пачку по одному соединению, вернуть неотправленные письма."""
+        failed = []
+        for job in batch:
+            msg = MIMEText(job.body)
+            msg["Subject"] = job.subject
+            msg["From"] = self.sender
+            msg["To"] = job.to
+            started = time.perf_counter()
+            result = "ok"
+            try:
+                server = self._ensure_connection()
+                server.sendmail(self.sender, job.to, msg.as_string())
+                self.sent += 1
+            except smtplib.SMTPRecipientsRefused as e:
+                logger.error("Адрес отклонён SMTP-сервером %s: %s", job.to, e)
+                self.failed += 1
+                result = "refused"
+            except Exception as e:
+                logger.error("Не удалось отправить письмо для %s: %s", job.to, e)
+                self._close()
+                failed.append(job)
+                result = "error"
+            finally:
+                self._last_used = time.monotonic()
+                SMTP_SEND_DURATION.observe(time.perf_counter() - started, result)
+        return failed
+
+
+outbox = SMTPOutbox()
+
+
+def _outbox_metrics():
+    yield "# HELP email_outbox_queue_size Emails waiting in the outbox"
+    yield "# TYPE email_outbox_queue_size gauge"
+    yield f"email_outbox_queue_size {outbox.queue.qsize()}"
+    yield "# HELP email_outbox_sent_total Emails sent by the outbox worker"
+    yield "# TYPE email_outbox_sent_total counter"
+    yield f"email_outbox_sent_total {outbox.sent}"
+    yield "# HELP email_outbox_failed_total Emails dropped after retries or refused"
+    yield "# TYPE email_outbox_failed_total counter"
+    yield f"email_outbox_failed_total {outbox.failed}"
+
+
+registry.add_collector(_outbox_metrics)
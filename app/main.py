@@ -1,12 +1,65 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .logger import logger
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from .logger import logger, start_logging, stop_logging
+
+from .database import DB_CREATE_ALL, check_db, dispose_engines, init_db, init_engines
+from .mailer import outbox
+from .events import broker
+from .stats_buffer import STATS_WRITE_BEHIND, stats_buffer
+from .leaderboard import leaderboards
+from .sweepers import duel_reaper, processed_result_sweeper, verification_sweeper
+from .utils import shutdown_hash_executor
+from .metrics import MetricsMiddleware
+from .compression import CompressionMiddleware
+from .replicas import ReadYourWritesMiddleware, replica_monitor
+from .query_budget import QueryCountMiddleware
+from .routers import auth, duels, statistics, monitoring, admin
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Всё, что открывает соединения, — здесь, в процессе воркера, а не при импорте
+    app.state.ready = False
+    start_logging()
+    init_engines()
+    if DB_CREATE_ALL:
+        await init_db()
+    # Первое соединение пула открываем до того, как воркер объявит готовность
+    await check_db()
+    replica_monitor.start()
+    outbox.start()
+    await broker.start()
+    if STATS_WRITE_BEHIND:
+        stats_buffer.start()
+    leaderboards.start()
+    verification_sweeper.start()
+    duel_reaper.start()
+    processed_result_sweeper.start()
+    app.state.ready = True
+    logger.info('Starting API...', extra={"sample": False})
+    yield
+    app.state.ready = False
+    # Сбрасываем буфер статистики, досылаем письма и гасим пул хэширования
+    await processed_result_sweeper.stop()
+    await duel_reaper.stop()
+    await verification_sweeper.stop()
+    await leaderboards.stop()
+    if STATS_WRITE_BEHIND:
+        await stats_buffer.stop()
+    await broker.stop()
+    await outbox.stop()
+    shutdown_hash_executor()
+    await replica_monitor.stop()
+    await dispose_engines()
+    stop_logging()
 
-from .database import init_db
-from .routers import auth, duels, statistics
 
-app = FastAPI()
-logger.info('Starting API...')
+# orjson вместо json из стандартной библиотеки для всех ответов по умолчанию
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # ---- CORS ----
 origins = [
@@ -21,11 +74,34 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Разрешить все методы: GET, POST, OPTIONS, DELETE...
     allow_headers=["*"],  # Разрешить любые заголовки
+    # курсор пагинации GET /duels, версии для If-None-Match, отметка read-your-writes
+    expose_headers=["X-Next-Cursor", "ETag", "X-Read-Primary-Until"],
 )
 
-# Инициализация базы и создание таблиц
-init_db()
+# Пул соединений исчерпан: быстро отвечаем 503, а не держим воркер
+@app.exception_handler(PoolTimeoutError)
+async def pool_timeout_handler(request: Request, exc: PoolTimeoutError):
+    logger.warning("Нет свободных соединений с БД: %s %s", request.method, request.url.path)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, try again later"},
+        headers={"Retry-After": "1"},
+    )
+
+# После записи клиент какое-то время читает с основной БД, а не с реплики
+app.add_middleware(ReadYourWritesMiddleware)
+
+# br/gzip для крупных ответов (списки дуэлей, лидерборды)
+app.add_middleware(CompressionMiddleware)
+
+# SQL-запросы на HTTP-запрос: бюджеты и N+1 в лог, X-Query-Count при QUERY_DEBUG=1
+app.add_middleware(QueryCountMiddleware)
+
+# Задержки и статусы по маршрутам для /metrics
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(duels.router, prefix="/duels", tags=["Duels"])
 app.include_router(statistics.router, prefix="/statistics", tags=["Statistics"])
+app.include_router(monitoring.router, tags=["Monitoring"])
+app.include_router(admin.router, prefix="/admin", tags=["Admin"])
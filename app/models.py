@@ -1,7 +1,8 @@
-from typing import Optional
+from typing import List, Literal, Optional
 from datetime import datetime
+from sqlalchemy import Index, UniqueConstraint, text
 from sqlmodel import SQLModel, Field, Relationship
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr, Field as PydanticField
 
 # Модели базы данных
 class User(SQLModel, table=True):
@@ -9,8 +10,9 @@ class User(SQLModel, table=True):
     email: EmailStr = Field(index=True, unique=True)
     hashed_password: str
     is_verified: bool = Field(default=False)
-    verification_token: Optional[str] = None
-    verification_expire: Optional[datetime] = None
+    # sha256 от токена из письма: сам токен в БД не хранится
+    verification_token_hash: Optional[str] = Field(default=None, max_length=64, index=True, unique=True)
+    verification_expire: Optional[datetime] = Field(default=None, index=True)
     statistics: Optional["Statistics"] = Relationship(back_populates="user")
 
 class Statistics(SQLModel, table=True):
@@ -25,15 +27,71 @@ class Statistics(SQLModel, table=True):
     duels: int = Field(default=0)
     duels_won: int = Field(default=0)
 
+    # Растёт при каждом изменении счётчиков — из него строится ETag
+    version: int = Field(default=0)
+
     # связь (опционально, пригодится)
     user: Optional["User"] = Relationship(back_populates="statistics")
 
+# Уже учтённые результаты из POST /statistics/batch (идемпотентность по id клиента)
+class ProcessedResult(SQLModel, table=True):
+    __tablename__ = "processed_result"
+    __table_args__ = (UniqueConstraint("user_id", "client_id", name="uq_processed_result_user_client"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    user_id: int = Field(foreign_key="user.id")
+    client_id: str = Field(max_length=64)
+    # По нему уборщик удаляет записи старше окна дедупликации
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+# Счётчики изменений целых таблиц (например, дуэлей) для ETag списков
+class TableVersion(SQLModel, table=True):
+    __tablename__ = "table_version"
+
+    name: str = Field(primary_key=True, max_length=64)
+    version: int = Field(default=0)
+
+# Статусы дуэли: ждёт соперника -> идёт -> завершена; expired — истекла, не дождавшись
+DUEL_OPEN = "open"
+DUEL_ACTIVE = "active"
+DUEL_FINISHED = "finished"
+DUEL_EXPIRED = "expired"
+
 # Дуэль (таблица)
 class Duel(SQLModel, table=True):
+    __table_args__ = (
+        # Частичный индекс по открытым дуэлям для лобби (open_only)
+        Index(
+            "ix_duel_open_id", "id",
+            postgresql_where=text("join_id IS NULL"),
+            sqlite_where=text("join_id IS NULL"),
+        ),
+        # Уборщик выбирает самые старые дуэли в нужном статусе
+        Index("ix_duel_status_created_at", "status", "created_at"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
-    creator_id: int = Field(foreign_key="user.id")
-    join_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    creator_id: int = Field(foreign_key="user.id", index=True)
+    join_id: Optional[int] = Field(default=None, foreign_key="user.id", index=True)
     winner_id: Optional[int] = Field(default=None, foreign_key="user.id")
+    status: str = Field(default=DUEL_OPEN, max_length=16)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    joined_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+# Завершённые и истёкшие дуэли, вынесенные из горячей таблицы duel
+class DuelHistory(SQLModel, table=True):
+    __tablename__ = "duel_history"
+
+    id: int = Field(primary_key=True)  # id из таблицы duel
+    creator_id: int = Field(index=True)
+    join_id: Optional[int] = Field(default=None, index=True)
+    winner_id: Optional[int] = None
+    status: str = Field(max_length=16)
+    created_at: datetime
+    joined_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    archived_at: datetime = Field(default_factory=datetime.utcnow)
 
 
 # ----- Pydantic схемы -----
@@ -53,8 +111,7 @@ class UserRead(BaseModel):
     email: EmailStr
     is_verified: bool
 
-    class Config:
-        from_attributes = True   # чтобы можно было возвращать SQLModel-объекты
+    model_config = ConfigDict(from_attributes=True)   # чтобы можно было возвращать SQLModel-объекты
 
 class StatisticsRead(BaseModel):
     games: int
@@ -62,8 +119,27 @@ class StatisticsRead(BaseModel):
     duels: int
     duels_won: int
 
-    class Config:
-        orm_mode = True
+    model_config = ConfigDict(from_attributes=True)
+
+# Дуэль наружу: только поля таблицы, без связей SQLModel
+class DuelRead(BaseModel):
+    id: int
+    creator_id: int
+    join_id: Optional[int] = None
+    winner_id: Optional[int] = None
+    status: str
+    created_at: datetime
+    joined_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class MessageResponse(BaseModel):
+    message: str
+
+class TokenResponse(BaseModel):
+    access_token: str
+    token_type: str
 
 # Запрос
 class GameResult(BaseModel):
@@ -72,6 +148,17 @@ class GameResult(BaseModel):
 class DuelResult(BaseModel):
     won: bool  # True - выиграл, False - проиграл
 
+class DuelWinner(BaseModel):
+    winner_id: int  # id создателя или присоединившегося
+
+class BatchResultItem(BaseModel):
+    id: str = PydanticField(min_length=1, max_length=64)  # id, сгенерированный клиентом
+    type: Literal["game", "duel"]
+    won: bool
+
+class StatisticsBatch(BaseModel):
+    results: List[BatchResultItem]
+
 # Ответ
 class GameStatisticsResponse(BaseModel):
     message: str
@@ -85,3 +172,28 @@ class DuelStatisticsResponse(BaseModel):
     duels: int
     duels_won: int
 
+class StatisticsBatchResponse(BaseModel):
+    message: str
+    user_email: EmailStr
+    applied: int
+    duplicates: int
+    games: int
+    games_won: int
+    duels: int
+    duels_won: int
+
+class LeaderboardEntry(BaseModel):
+    rank: int
+    user_id: int
+    score: float
+
+class LeaderboardResponse(BaseModel):
+    board: str
+    total: int
+    items: List[LeaderboardEntry]
+
+class RankResponse(BaseModel):
+    board: str
+    total: int
+    rank: Optional[int] = None  # None — пользователь пока не попал в рейтинг
+    score: Optional[float] = None
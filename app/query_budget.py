@@ -0,0 +1,163 @@
+# Подсчёт SQL-запросов на HTTP-запрос, бюджеты по эндпоинтам и поиск N+1.
+import os
+import re
+from collections import Counter as CounterDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+
+from .logger import logger
+
+load_dotenv()
+
+# QUERY_DEBUG=1 — заголовки X-Query-Count / X-Query-Repeats в каждом ответе
+QUERY_DEBUG = os.getenv("QUERY_DEBUG", "0") == "1"
+# Сколько одинаковых запросов за один HTTP-запрос считать признаком N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "3"))
+
+# Максимум SQL-запросов на эндпоинт (шаблон пути), худший случай:
+# промах кэша пользователей, коммит и т.п. Новый маршрут — новая строка здесь.
+QUERY_BUDGETS: Dict[Tuple[str, str], int] = {
+    ("POST", "/auth/register"): 2,
+    ("POST", "/auth/login"): 2,
+    ("GET", "/auth/me"): 1,
+    ("GET", "/auth/verify"): 2,
+    ("GET", "/duels/"): 2,
+    ("GET", "/duels/events"): 0,
+    ("GET", "/duels/{duel_id}/events"): 0,
+    ("POST", "/duels/"): 3,
+    ("POST", "/duels/match"): 4,
+    ("PUT", "/duels/{duel_id}/join"): 3,
+    ("POST", "/duels/{duel_id}/result"): 3,
+    ("DELETE", "/duels/{duel_id}"): 3,
+    ("GET", "/statistics/"): 3,
+    ("POST", "/statistics/game"): 2,
+    ("POST", "/statistics/duel"): 2,
+    ("POST", "/statistics/batch"): 3,
+    ("GET", "/statistics/leaderboard"): 1,
+    ("GET", "/statistics/rank"): 1,
+    ("GET", "/metrics"): 0,
+    ("GET", "/internal/pool"): 0,
+    ("GET", "/health/live"): 0,
+    ("GET", "/health/ready"): 1,
+    ("GET", "/admin/export/{table}"): 2,
+}
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+class QueryLog:
+    """SQL-запросы, выполненные в рамках одного HTTP-запроса (или блока track_queries)."""
+
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def record(self, statement: str) -> None:
+        self.statements.append(_WHITESPACE.sub(" ", statement).strip())
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> Dict[str, int]:
+        """Одинаковые (с точностью до параметров) запросы, выполненные threshold раз и больше."""
+        return {sql: n for sql, n in CounterDict(self.statements).items() if n >= threshold}
+
+
+_current_log: ContextVar[Optional[QueryLog]] = ContextVar("query_log", default=None)
+
+# Подписчики на завершённые HTTP-запросы: (method, route, log) — для фикстур pytest
+Observer = Callable[[str, str, QueryLog], None]
+_observers: List[Observer] = []
+
+
+def add_observer(observer: Observer) -> None:
+    _observers.append(observer)
+
+
+def remove_observer(observer: Observer) -> None:
+    _observers.remove(observer)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryLog]:
+    """Считать запросы текущего контекста (задачи asyncio и её дочерних задач)."""
+    log = QueryLog()
+    token = _current_log.set(log)
+    try:
+        yield log
+    finally:
+        _current_log.reset(token)
+
+
+def install_query_counter(engine) -> None:
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        log = _current_log.get()
+        if log is not None:
+            log.record(statement)
+
+
+def budget_for(method: str, route: str) -> Optional[int]:
+    return QUERY_BUDGETS.get((method, route))
+
+
+def missing_budgets(app) -> List[str]:
+    """Маршруты приложения, для которых не задан бюджет в QUERY_BUDGETS."""
+    missing = []
+    for route in app.routes:
+        for method in sorted(getattr(route, "methods", None) or ()):
+            if method != "HEAD" and route.path not in ("/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc") \
+                    and budget_for(method, route.path) is None:
+                missing.append(f"{method} {route.path}")
+    return missing
+
+
+def check_query_log(method: str, route: str, log: QueryLog) -> List[str]:
+    """Нарушения для запроса: превышение бюджета и повторяющиеся запросы."""
+    problems = []
+    budget = budget_for(method, route)
+    if budget is not None and log.count > budget:
+        problems.append(f"{method} {route}: {log.count} SQL-запросов при бюджете {budget}")
+    for sql, n in log.repeated().items():
+        problems.append(f"{method} {route}: возможный N+1, {n} раз: {sql[:200]}")
+    return problems
+
+
+class QueryCountMiddleware:
+    """ASGI-middleware: счётчик запросов к БД на HTTP-запрос, предупреждения в лог, debug-заголовки."""
+
+    def __init__(self, app, debug: bool = QUERY_DEBUG):
+        self.app = app
+        self.debug = debug
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with track_queries() as log:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start" and self.debug:
+                    # Тело может ещё стримиться, но запросы обработчика к этому моменту уже выполнены
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (b"x-query-count", str(log.count).encode()),
+                        (b"x-query-repeats", str(sum(log.repeated().values())).encode()),
+                    ]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    for problem in check_query_log(scope["method"], route, log):
+                        logger.warning(problem)
+                    for observer in _observers:
+                        observer(scope["method"], route, log)
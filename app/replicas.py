@@ -0,0 +1,170 @@
+# Маршрутизация чтения на реплику: отставание, read-your-writes, откат на основную БД.
+import asyncio
+import math
+import os
+import time
+from typing import Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+from sqlalchemy import text
+
+from . import database
+from .logger import logger
+from .metrics import Counter, registry
+
+load_dotenv()
+
+# Реплика используется, только пока её отставание не больше этого, секунды
+REPLICA_MAX_LAG = float(os.getenv("REPLICA_MAX_LAG", "5"))
+REPLICA_LAG_CHECK_INTERVAL = float(os.getenv("REPLICA_LAG_CHECK_INTERVAL", "2"))
+# Сколько секунд после успешной записи клиент читает с основной БД
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW", "5"))
+
+# Клиент получает отметку после записи и возвращает её cookie или заголовком
+READ_PRIMARY_COOKIE = "read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+# X-Read-Consistency: strong — явное чтение с основной БД
+CONSISTENCY_HEADER = "X-Read-Consistency"
+
+_UNSAFE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+# Отставание реплики: 0, если реплика догнала основную БД (или это не реплика)
+_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+READ_SESSIONS = registry.register(Counter(
+    "db_read_sessions_total", "Read-only sessions by target database and reason", ("target", "reason")))
+
+
+class ReplicaMonitor:
+    """Периодически замеряет отставание реплики; недоступная реплика считается бесконечно отстающей."""
+
+    def __init__(self, interval: float = REPLICA_LAG_CHECK_INTERVAL):
+        self.interval = interval
+        self.lag = math.inf
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.lag <= REPLICA_MAX_LAG
+
+    async def check(self) -> float:
+        engine = database.replica_engine
+        try:
+            async with engine.connect() as conn:
+                if engine.dialect.name == "postgresql":
+                    self.lag = float((await conn.execute(_LAG_QUERY)).scalar_one())
+                else:
+                    await conn.execute(text("SELECT 1"))
+                    self.lag = 0.0
+        except Exception as e:
+            if self.lag != math.inf:
+                logger.warning("Реплика недоступна, чтение идёт с основной БД: %s", e)
+            self.lag = math.inf
+        return self.lag
+
+    def start(self) -> None:
+        if database.replica_engine is not None and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            was_healthy = self.healthy
+            await self.check()
+            if was_healthy and not self.healthy and self.lag != math.inf:
+                logger.warning("Отставание реплики %.1f с больше %s с, чтение идёт с основной БД",
+                               self.lag, REPLICA_MAX_LAG)
+            await asyncio.sleep(self.interval)
+
+
+replica_monitor = ReplicaMonitor()
+
+
+def _replica_lag_metrics():
+    if database.replica_engine is None:
+        return
+    yield "# HELP db_replica_lag_seconds Replication lag of the read replica (+Inf if unreachable)"
+    yield "# TYPE db_replica_lag_seconds gauge"
+    yield f"db_replica_lag_seconds {'+Inf' if replica_monitor.lag == math.inf else replica_monitor.lag}"
+
+
+registry.add_collector(_replica_lag_metrics)
+
+
+def _primary_reason(request: Request) -> Optional[str]:
+    """Почему этот запрос должен читать с основной БД (None — можно с реплики)."""
+    if database.replica_engine is None:
+        return "no_replica"
+    if request.headers.get(CONSISTENCY_HEADER, "").lower() == "strong":
+        return "strong"
+    marker = request.headers.get(READ_PRIMARY_HEADER) or request.cookies.get(READ_PRIMARY_COOKIE)
+    if marker:
+        try:
+            if float(marker) > time.time():
+                return "read_your_writes"
+        except ValueError:
+            pass
+    if not replica_monitor.healthy:
+        return "lag"
+    return None
+
+
+def read_session_maker():
+    """Фабрика сессий для фонового чтения вне запроса (выгрузки и т.п.)."""
+    if database.replica_engine is not None and replica_monitor.healthy:
+        return database.replica_session_maker
+    return database.async_session_maker
+
+
+async def get_read_session(request: Request):
+    """Сессия для эндпоинтов только на чтение: реплика, если ей можно доверять."""
+    reason = _primary_reason(request)
+    if reason is None:
+        READ_SESSIONS.inc("replica", "ok")
+        session_maker = database.replica_session_maker
+    else:
+        READ_SESSIONS.inc("primary", reason)
+        session_maker = database.async_session_maker
+    async with session_maker() as session:
+        yield session
+
+
+class ReadYourWritesMiddleware:
+    """После успешного изменяющего запроса отдать клиенту отметку «читать с основной БД до ...»."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] not in _UNSAFE_METHODS
+                or database.replica_engine is None):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                until = f"{time.time() + READ_YOUR_WRITES_WINDOW:.3f}"
+                cookie = (f"{READ_PRIMARY_COOKIE}={until}; Max-Age={math.ceil(READ_YOUR_WRITES_WINDOW)}; "
+                          "Path=/; HttpOnly; SameSite=Lax")
+                message["headers"] = list(message.get("headers", [])) + [
+                    (READ_PRIMARY_HEADER.lower().encode(), until.encode()),
+                    (b"set-cookie", cookie.encode()),
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+
+from app.export import MEDIA_TYPES, ExportFormat, ExportTable, export_chunks
+from app.logger import logger
+from app.models import User
+from app.routers.helper import require_admin
+
+router = APIRouter()
+
+
+# ------- GET /admin/export/{table} -------
+@router.get("/export/{table}")
+async def export_table(table: ExportTable,
+                       format: ExportFormat = "ndjson",
+                       admin: User = Depends(require_admin)):
+    """Потоковая выгрузка statistics или duels с email игроков (NDJSON или CSV).
+
+    Строки читаются серверным курсором и отдаются кусками: следующая пачка
+    читается из БД, только когда клиент забрал предыдущую.
+    """
+    logger.info("Выгрузка %s (%s) администратором %s", table, format, admin.email)
+    return StreamingResponse(
+        export_chunks(table, format),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'},
+    )
@@ -1,16 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
-from sqlmodel import Session, select
+from sqlalchemy.exc import IntegrityError, TimeoutError as PoolTimeoutError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
 
 from app.database import get_session
-from app.models import User, UserCreate, UserRead, Statistics
+from app.models import MessageResponse, TokenResponse, User, UserCreate, UserRead
 from app.utils import (
-    hash_password, verify_password, create_access_token,
-    decode_token, create_verification_token, send_verification_email
+    hash_password_async, verify_and_update_password_async, PasswordHashBusy,
+    create_access_token, decode_token, create_verification_token,
+    hash_verification_token, verification_email
 )
-from app.routers.helper import get_current_user
+from app.mailer import outbox
+from app.routers.helper import get_current_user_read
+from app.db_helpers import create_user_with_statistics
 
 from app.logger import logger
 
@@ -22,89 +27,103 @@ security = HTTPBearer()
 
 
 # ---------- Endpoints ----------
-@router.post("/register")
-def register(user_data: UserCreate, session: Session = Depends(get_session)):
-    logger.info(f"Попытка регистрации пользователя: {user_data.email}")
+@router.post("/register", response_model=MessageResponse)
+async def register(user_data: UserCreate, session: AsyncSession = Depends(get_session)):
+    logger.info("Попытка регистрации пользователя: %s", user_data.email)
 
     try:
-        existing = session.exec(
-            select(User).where(User.email == user_data.email)
-        ).first()
-
-        if existing:
-            logger.warning(f"Регистрация отклонена — email уже используется: {user_data.email}")
-            raise HTTPException(status_code=400, detail="Email already registered")
-
         token, expires = create_verification_token()
+        try:
+            hashed_password = await hash_password_async(user_data.password)
+        except PasswordHashBusy:
+            logger.warning("Регистрация отклонена — очередь хэширования переполнена: %s", user_data.email)
+            raise HTTPException(status_code=503, detail="Server busy, try again later",
+                                headers={"Retry-After": "1"})
 
-        new_user = User(
-            email=user_data.email,
-            hashed_password=hash_password(user_data.password),
-            is_verified=False,
-            verification_token=token,
-            verification_expire=expires,
-        )
-
-        session.add(new_user)
-        session.commit()
-        session.refresh(new_user)
-        stats = Statistics(user_id=new_user.id)
-        session.add(stats)
-        session.commit()
+        # Дубликат ловим по уникальному индексу на email, без предварительного SELECT
+        try:
+            await create_user_with_statistics(
+                session,
+                email=user_data.email,
+                hashed_password=hashed_password,
+                is_verified=False,
+                verification_token_hash=hash_verification_token(token),
+                verification_expire=expires,
+            )
+            await session.commit()
+        except IntegrityError:
+            await session.rollback()
+            logger.warning("Регистрация отклонена — email уже используется: %s", user_data.email)
+            raise HTTPException(status_code=400, detail="Email already registered")
 
-        logger.info(f"Пользователь создан: {new_user.email}, отправка письма подтверждения")
+        logger.info("Пользователь создан: %s, письмо подтверждения поставлено в очередь", user_data.email)
 
         try:
-            send_verification_email(new_user.email, token)
+            outbox.enqueue(verification_email(user_data.email, token))
         except Exception as email_error:
-            logger.error(f"Ошибка отправки письма: {email_error}")
+            logger.error("Ошибка постановки письма в очередь: %s", email_error)
 
         return {"message": "User created, verification email sent"}
 
-    except HTTPException:
+    except (HTTPException, PoolTimeoutError):
         raise
     except Exception as e:
-        session.rollback()
-        logger.error(f"Ошибка регистрации: {e}")
+        await session.rollback()
+        logger.error("Ошибка регистрации: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
-@router.post("/login")
-def login(data: UserCreate, session: Session = Depends(get_session)):
-    logger.info(f"Попытка входа: {data.email}")
+@router.post("/login", response_model=TokenResponse)
+async def login(data: UserCreate, session: AsyncSession = Depends(get_session)):
+    logger.info("Попытка входа: %s", data.email)
 
-    user = session.exec(
+    user = (await session.exec(
         select(User).where(User.email == data.email)
-    ).first()
+    )).first()
 
     if not user:
-        logger.warning(f"Вход отклонён — пользователь не найден: {data.email}")
+        logger.warning("Вход отклонён — пользователь не найден: %s", data.email)
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
-    if not verify_password(data.password, user.hashed_password):
-        logger.warning(f"Вход отклонён — неверный пароль: {data.email}")
+    try:
+        valid, new_hash = await verify_and_update_password_async(data.password, user.hashed_password)
+    except PasswordHashBusy:
+        logger.warning("Вход отклонён — очередь хэширования переполнена: %s", data.email)
+        raise HTTPException(status_code=503, detail="Server busy, try again later",
+                            headers={"Retry-After": "1"})
+
+    if not valid:
+        logger.warning("Вход отклонён — неверный пароль: %s", data.email)
         raise HTTPException(status_code=401, detail="Invalid email or password")
 
+    # Параметры хэширования изменились — прозрачно перехэшируем пароль
+    if new_hash:
+        user.hashed_password = new_hash
+        session.add(user)
+        await session.commit()
+        logger.info("Пароль перехэширован с новыми параметрами: %s", user.email)
+
     token = create_access_token({"user_id": user.id})
 
-    logger.info(f"Пользователь вошёл: {user.email}")
+    logger.info("Пользователь вошёл: %s", user.email)
     return {"access_token": token, "token_type": "bearer"}
 
 
 @router.get("/me", response_model=UserRead)
-def me(current_user: User = Depends(get_current_user)):
-    logger.info(f"Запрос информации о пользователе: {current_user.email}")
+async def me(current_user: User = Depends(get_current_user_read)):
+    logger.info("Запрос информации о пользователе: %s", current_user.email)
     return current_user
 
 
-@router.get("/verify")
-def verify_email(token: str, session: Session = Depends(get_session)):
-    logger.info(f"Запрос подтверждения email по токену: {token}")
+@router.get("/verify", response_model=MessageResponse)
+async def verify_email(token: str, session: AsyncSession = Depends(get_session)):
+    # Сам токен не логируем — по нему можно подтвердить чужой email
+    logger.info("Запрос подтверждения email")
 
     try:
-        user = session.exec(
-            select(User).where(User.verification_token == token)
-        ).first()
+        user = (await session.exec(
+            select(User).where(User.verification_token_hash == hash_verification_token(token))
+        )).first()
 
         if not user:
             logger.warning("Попытка подтверждения с неверным токеном")
@@ -115,18 +134,18 @@ def verify_email(token: str, session: Session = Depends(get_session)):
             raise HTTPException(status_code=400, detail="Token expired")
 
         user.is_verified = True
-        user.verification_token = None
+        user.verification_token_hash = None
         user.verification_expire = None
 
         session.add(user)
-        session.commit()
+        await session.commit()
 
-        logger.info(f"Email успешно подтверждён: {user.email}")
+        logger.info("Email успешно подтверждён: %s", user.email)
         return {"message": "Email verified successfully"}
 
-    except HTTPException:
+    except (HTTPException, PoolTimeoutError):
         raise
     except Exception as e:
-        session.rollback()
-        logger.error(f"Ошибка подтверждения email: {e}")
+        await session.rollback()
+        logger.error("Ошибка подтверждения email: %s", e)
         raise HTTPException(status_code=500, detail="Internal server error")
\ No newline at end of file
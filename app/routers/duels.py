@@ -1,20 +1,38 @@
 # app/routers/duels.py
-from fastapi import APIRouter, Depends, HTTPException, status
+import asyncio
+import os
+from datetime import datetime
+from typing import List, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import Session, select
+from sqlalchemy import update
+from sqlmodel import select, or_
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.database import get_session
-from app.models import Duel
+from app.models import DUEL_ACTIVE, DUEL_FINISHED, Duel, DuelRead, DuelWinner, MessageResponse
 from app.utils import decode_token
+from app.etag import DUELS_VERSION, bump_table_version, make_etag, not_modified, table_version
+from app.leaderboard import leaderboards
+from app.db_helpers import increment_statistics_many
+from app.replicas import get_read_session
+from app.events import broker, publish_duel_event, duel_channel, LOBBY_CHANNEL
 from app.logger import logger
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Жёсткий предел размера страницы для GET /duels
+DUELS_PAGE_MAX = int(os.getenv("DUELS_PAGE_MAX", "100"))
+# Интервал keepalive-комментариев в SSE-потоке, секунды
+SSE_KEEPALIVE = float(os.getenv("SSE_KEEPALIVE", "15"))
+
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
-    logger.info(f"Получен токен для дуэлей: {token}")
 
     data = decode_token(token)
     if not data:
@@ -32,69 +50,279 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Invalid token payload",
         )
 
-    logger.info(f"Авторизован пользователь (duels): {user_id}")
+    logger.info("Авторизован пользователь (duels): %s", user_id)
     return user_id
 
 
 # ------- GET /duels -------
-@router.get("/")
-def get_duels(session: Session = Depends(get_session)):
-    logger.info("Запрос списка дуэлей")
-    return session.exec(select(Duel)).all()
+@router.get("/", response_model=List[DuelRead])
+async def get_duels(
+    request: Request,
+    response: Response,
+    after_id: Optional[int] = Query(None, description="Курсор: id последней дуэли предыдущей страницы"),
+    limit: int = Query(50, ge=1),
+    open_only: bool = False,
+    creator_id: Optional[int] = None,
+    participant: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """Страница дуэлей по возрастанию id (keyset-пагинация).
+
+    Курсор следующей страницы возвращается в заголовке X-Next-Cursor,
+    если страница заполнена целиком. ETag — счётчик изменений таблицы
+    дуэлей: пока он не изменился, на If-None-Match отвечаем 304 без выборки.
+    """
+    limit = min(limit, DUELS_PAGE_MAX)
+    logger.info("Запрос списка дуэлей: after_id=%s, limit=%s", after_id, limit)
+
+    cached = not_modified(request, response, make_etag("duels", await table_version(session, DUELS_VERSION)))
+    if cached is not None:
+        return cached
+
+    statement = select(Duel)
+    if after_id is not None:
+        statement = statement.where(Duel.id > after_id)
+    if open_only:
+        statement = statement.where(Duel.join_id == None)  # noqa: E711
+    if creator_id is not None:
+        statement = statement.where(Duel.creator_id == creator_id)
+    if participant is not None:
+        statement = statement.where(or_(Duel.creator_id == participant, Duel.join_id == participant))
+    statement = statement.order_by(Duel.id).limit(limit)
+
+    duels = (await session.exec(statement)).all()
+    if len(duels) == limit:
+        response.headers["X-Next-Cursor"] = str(duels[-1].id)
+    return duels
+
+
+# ------- GET /duels/events (SSE) -------
+async def _event_stream(request: Request, channel: str):
+    """Поток Server-Sent Events для канала брокера."""
+    async with broker.subscribe(channel) as queue:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {orjson.dumps(event['duel']).decode()}\n\n"
+
+
+def _sse_response(request: Request, channel: str) -> StreamingResponse:
+    return StreamingResponse(
+        _event_stream(request, channel),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/events")
+async def lobby_events(request: Request):
+    """События лобби: created/joined/deleted для всех дуэлей."""
+    logger.info("Подписка на события лобби")
+    return _sse_response(request, LOBBY_CHANNEL)
+
+
+@router.get("/{duel_id}/events")
+async def duel_events(duel_id: int, request: Request):
+    """События одной дуэли: joined/deleted."""
+    logger.info("Подписка на события дуэли %s", duel_id)
+    return _sse_response(request, duel_channel(duel_id))
 
 
 # ------- POST /duels -------
-@router.post("/")
-def create_duel(user_id: int = Depends(get_current_user),
-                session: Session = Depends(get_session)):
-    logger.info(f"Создание новой дуэли пользователем {user_id}")
+@router.post("/", response_model=DuelRead)
+async def create_duel(user_id: int = Depends(get_current_user),
+                      session: AsyncSession = Depends(get_session)):
+    logger.info("Создание новой дуэли пользователем %s", user_id)
+
+    duel = Duel(creator_id=user_id)
+    session.add(duel)
+    await session.flush()
+    await bump_table_version(session, DUELS_VERSION)
+    await session.commit()
+    await session.refresh(duel)
+
+    logger.info("Дуэль создана: id=%s, creator=%s", duel.id, user_id)
+    await publish_duel_event("created", duel)
+    return duel
+
+
+# ------- POST /duels/match -------
+@router.post("/match", response_model=DuelRead)
+async def match_duel(response: Response,
+                     user_id: int = Depends(get_current_user),
+                     session: AsyncSession = Depends(get_session)):
+    """Занять самую старую открытую дуэль другого игрока; если таких нет — вернуть
+    свою открытую (200) или создать новую (201)."""
+    logger.info("Подбор дуэли для пользователя %s", user_id)
+
+    candidate = (
+        select(Duel.id)
+        .where(Duel.join_id == None, Duel.creator_id != user_id)  # noqa: E711
+        .order_by(Duel.id)
+        .limit(1)
+    )
+    if session.bind.dialect.name == "postgresql":
+        # Конкурирующие запросы пропускают уже захваченные строки, а не ждут их
+        candidate = candidate.with_for_update(skip_locked=True)
+
+    # SQLite сериализует запись, поэтому тот же UPDATE там атомарен и без блокировок
+    duel = (await session.exec(
+        update(Duel)
+        .where(Duel.id == candidate.scalar_subquery(), Duel.join_id == None)  # noqa: E711
+        .values(join_id=user_id, status=DUEL_ACTIVE, joined_at=datetime.utcnow())
+        .returning(Duel)
+    )).scalar_one_or_none()
+
+    if duel is not None:
+        await bump_table_version(session, DUELS_VERSION)
+        await session.commit()
+        logger.info("Пользователь %s присоединился к дуэли %s (подбор)", user_id, duel.id)
+        await publish_duel_event("joined", duel)
+        return duel
+
+    # Повторный вызов (ретрай, опрос) не плодит дуэли: отдаём свою уже открытую
+    own = (await session.exec(
+        select(Duel)
+        .where(Duel.creator_id == user_id, Duel.join_id == None)  # noqa: E711
+        .order_by(Duel.id)
+        .limit(1)
+    )).first()
+    if own is not None:
+        logger.info("Свободных дуэлей нет, у пользователя %s уже есть открытая дуэль %s", user_id, own.id)
+        return own
 
     duel = Duel(creator_id=user_id)
     session.add(duel)
-    session.commit()
-    session.refresh(duel)
+    # Все поля известны после flush, а expire_on_commit=False — refresh не нужен
+    await session.flush()
+    await bump_table_version(session, DUELS_VERSION)
+    await session.commit()
 
-    logger.info(f"Дуэль создана: id={duel.id}, creator={user_id}")
+    response.status_code = status.HTTP_201_CREATED
+    logger.info("Свободных дуэлей нет, создана дуэль %s для пользователя %s", duel.id, user_id)
+    await publish_duel_event("created", duel)
     return duel
 
 
 # ------- PUT /duels/{id}/join -------
-@router.put("/{duel_id}/join")
-def join_duel(duel_id: int,
-              user_id: int = Depends(get_current_user),
-              session: Session = Depends(get_session)):
-    logger.info(f"Пользователь {user_id} пытается присоединиться к дуэли {duel_id}")
+@router.put("/{duel_id}/join", response_model=DuelRead)
+async def join_duel(duel_id: int,
+                    user_id: int = Depends(get_current_user),
+                    session: AsyncSession = Depends(get_session)):
+    logger.info("Пользователь %s пытается присоединиться к дуэли %s", user_id, duel_id)
 
-    duel = session.get(Duel, duel_id)
-    if not duel:
-        logger.warning(f"Дуэль не найдена: {duel_id}")
-        raise HTTPException(status_code=404, detail="Duel not found")
+    # Условный UPDATE: слот занимает только тот, кто успел первым, и не сам создатель
+    duel = (await session.exec(
+        update(Duel)
+        .where(Duel.id == duel_id, Duel.join_id == None, Duel.creator_id != user_id)  # noqa: E711
+        .values(join_id=user_id, status=DUEL_ACTIVE, joined_at=datetime.utcnow())
+        .returning(Duel)
+    )).scalar_one_or_none()
+    if duel is not None:
+        await bump_table_version(session, DUELS_VERSION)
+    await session.commit()
 
-    if duel.join_id is not None:
-        logger.warning(f"Дуэль {duel_id} уже заполнена")
+    if duel is None:
+        existing = await session.get(Duel, duel_id)
+        if existing is None:
+            logger.warning("Дуэль не найдена: %s", duel_id)
+            raise HTTPException(status_code=404, detail="Duel not found")
+        if existing.creator_id == user_id:
+            logger.warning("Пользователь %s пытается присоединиться к своей дуэли %s", user_id, duel_id)
+            raise HTTPException(status_code=400, detail="Cannot join your own duel")
+        logger.warning("Дуэль %s уже заполнена", duel_id)
         raise HTTPException(status_code=400, detail="Duel already full")
 
-    duel.join_id = user_id
-    session.add(duel)
-    session.commit()
-    session.refresh(duel)
+    logger.info("Пользователь %s присоединился к дуэли %s", user_id, duel_id)
+    await publish_duel_event("joined", duel)
+    return duel
+
+
+# ------- POST /duels/{id}/result -------
+@router.post("/{duel_id}/result", response_model=DuelRead)
+async def set_duel_result(duel_id: int,
+                          result: DuelWinner,
+                          user_id: int = Depends(get_current_user),
+                          session: AsyncSession = Depends(get_session)):
+    """Зафиксировать победителя и обновить статистику обоих игроков.
+
+    Победитель и счётчики duels/duels_won обоих участников пишутся в одной
+    транзакции: условный UPDATE дуэли и один многострочный UPSERT статистики.
+    Вызывает любой из участников, один раз на дуэль.
+    """
+    logger.info("Пользователь %s фиксирует результат дуэли %s: победитель %s",
+                user_id, duel_id, result.winner_id)
+
+    # Результат ставится только один раз, только участником и только в заполненной дуэли
+    duel = (await session.exec(
+        update(Duel)
+        .where(
+            Duel.id == duel_id,
+            Duel.join_id != None,  # noqa: E711
+            # Дуэль «сам с собой» (до запрета в join) не даёт статистики
+            Duel.join_id != Duel.creator_id,
+            Duel.winner_id == None,  # noqa: E711
+            or_(Duel.creator_id == user_id, Duel.join_id == user_id),
+            or_(Duel.creator_id == result.winner_id, Duel.join_id == result.winner_id),
+        )
+        .values(winner_id=result.winner_id, status=DUEL_FINISHED, finished_at=datetime.utcnow())
+        .returning(Duel)
+    )).scalar_one_or_none()
+
+    if duel is None:
+        await session.rollback()
+        existing = await session.get(Duel, duel_id)
+        if existing is None:
+            logger.warning("Дуэль не найдена: %s", duel_id)
+            raise HTTPException(status_code=404, detail="Duel not found")
+        if user_id not in (existing.creator_id, existing.join_id):
+            logger.warning("Пользователь %s не участвует в дуэли %s", user_id, duel_id)
+            raise HTTPException(status_code=403, detail="Not a duel participant")
+        if existing.join_id is None:
+            raise HTTPException(status_code=400, detail="Duel is not full yet")
+        if existing.join_id == existing.creator_id:
+            logger.warning("Дуэль %s создана и занята одним игроком %s", duel_id, user_id)
+            raise HTTPException(status_code=400, detail="Winner and loser must be different players")
+        if existing.winner_id is not None:
+            logger.warning("Результат дуэли %s уже зафиксирован", duel_id)
+            raise HTTPException(status_code=409, detail="Duel result already recorded")
+        raise HTTPException(status_code=400, detail="Winner must be a duel participant")
+
+    loser_id = duel.join_id if duel.winner_id == duel.creator_id else duel.creator_id
+    # Мимо write-behind буфера: счётчики должны закоммититься вместе с winner_id
+    stats = await increment_statistics_many(session, {
+        duel.winner_id: {"duels": 1, "duels_won": 1},
+        loser_id: {"duels": 1},
+    })
+    await bump_table_version(session, DUELS_VERSION)
+    await session.commit()
 
-    logger.info(f"Пользователь {user_id} присоединился к дуэли {duel_id}")
+    for row in stats:
+        leaderboards.update(row)
+    logger.info("Дуэль %s завершена, победитель %s", duel_id, duel.winner_id)
+    await publish_duel_event("finished", duel)
     return duel
 
 
 # ------- DELETE /duels/{id} -------
-@router.delete("/{duel_id}")
-def delete_duel(duel_id: int, session: Session = Depends(get_session)):
-    logger.info(f"Удаление дуэли {duel_id}")
+@router.delete("/{duel_id}", response_model=MessageResponse)
+async def delete_duel(duel_id: int, session: AsyncSession = Depends(get_session)):
+    logger.info("Удаление дуэли %s", duel_id)
 
-    duel = session.get(Duel, duel_id)
+    duel = await session.get(Duel, duel_id)
     if not duel:
-        logger.warning(f"Попытка удаления несуществующей дуэли {duel_id}")
+        logger.warning("Попытка удаления несуществующей дуэли %s", duel_id)
         raise HTTPException(status_code=404, detail="Duel not found")
 
-    session.delete(duel)
-    session.commit()
+    await session.delete(duel)
+    await session.flush()
+    await bump_table_version(session, DUELS_VERSION)
+    await session.commit()
 
-    logger.info(f"Дуэль {duel_id} удалена")
+    logger.info("Дуэль %s удалена", duel_id)
+    await publish_duel_event("deleted", duel)
     return {"message": "Duel deleted"}
@@ -1,24 +1,44 @@
+import os
+
+from dotenv import load_dotenv
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
+from app import database
 from app.database import get_session
+from app.replicas import get_read_session
 from app.models import User
 from app.utils import decode_token
+from app.cache import get_cached_user, cache_user
 
 from app.logger import logger
 
+load_dotenv()
+
 router = APIRouter()
 security = HTTPBearer()
 
+# Администраторы (выгрузки и т.п.): email через запятую
+ADMIN_EMAILS = {email.strip().lower() for email in os.getenv("ADMIN_EMAILS", "").split(",") if email.strip()}
+
 # ---------- Helpers ----------
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
+) -> User:
+    return await _resolve_user(credentials.credentials, session)
+
+
+async def get_current_user_read(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    session: AsyncSession = Depends(get_read_session)
 ) -> User:
-    token = credentials.credentials
-    logger.info(f"Получен токен для проверки: {token}")
+    """get_current_user для эндпоинтов только на чтение: промах кэша читается с реплики."""
+    return await _resolve_user(credentials.credentials, session, primary_fallback=True)
+
 
+async def _resolve_user(token: str, session: AsyncSession, primary_fallback: bool = False) -> User:
     data = decode_token(token)
     if not data:
         logger.warning("Неверный или просроченный токен")
@@ -35,13 +55,26 @@ async def get_current_user(
             detail="Invalid token payload",
         )
 
-    user = session.get(User, user_id)
-    if not user:
-        logger.warning(f"Пользователь с id {user_id} не найден")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="User not found",
-        )
+    user = get_cached_user(user_id)
+    if user is None:
+        user = await session.get(User, user_id)
+        if not user and primary_fallback and session.bind is not database.async_engine:
+            # Только что зарегистрированный пользователь мог ещё не доехать до реплики
+            async with database.async_session_maker() as primary:
+                user = await primary.get(User, user_id)
+        if not user:
+            logger.warning("Пользователь с id %s не найден", user_id)
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found",
+            )
+        cache_user(user)
+
+    logger.info("Авторизован пользователь: %s", user.email)
+    return user
 
-    logger.info(f"Авторизован пользователь: {user.email}")
-    return user
\ No newline at end of file
+async def require_admin(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_verified or current_user.email.lower() not in ADMIN_EMAILS:
+        logger.warning("Отказано в доступе администратора: %s", current_user.email)
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin only")
+    return current_user
@@ -0,0 +1,78 @@
+# app/routers/monitoring.py
+import asyncio
+import os
+import secrets
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from app.database import check_db, pool_status
+from app.logger import logger
+from app.metrics import registry
+
+router = APIRouter()
+
+# /internal/* требует заголовок X-Internal-Token с этим значением; не задан — закрыты (404)
+INTERNAL_TOKEN = os.getenv("INTERNAL_TOKEN")
+# Сколько ждать SELECT 1 в /health/ready, секунды
+HEALTH_DB_TIMEOUT = float(os.getenv("HEALTH_DB_TIMEOUT", "2"))
+
+
+def require_internal(x_internal_token: Optional[str] = Header(None)):
+    if not INTERNAL_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not secrets.compare_digest(x_internal_token or "", INTERNAL_TOKEN):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Forbidden")
+
+
+def _pool_metrics():
+    stats = pool_status()
+    if "size" not in stats:
+        return
+    yield "# HELP db_pool_connections Pooled connections by state"
+    yield "# TYPE db_pool_connections gauge"
+    yield f'db_pool_connections{{state="checked_out"}} {stats["checked_out"]}'
+    yield f'db_pool_connections{{state="checked_in"}} {stats["checked_in"]}'
+    yield f'db_pool_connections{{state="overflow"}} {max(stats["overflow"], 0)}'
+    yield "# HELP db_pool_capacity Maximum connections (pool_size + max_overflow)"
+    yield "# TYPE db_pool_capacity gauge"
+    yield f"db_pool_capacity {stats['capacity']}"
+
+
+registry.add_collector(_pool_metrics)
+
+
+# ------- GET /metrics -------
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Метрики процесса в текстовом формате Prometheus."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# ------- GET /internal/pool -------
+@router.get("/internal/pool", dependencies=[Depends(require_internal)])
+async def internal_pool():
+    """Текущая загрузка пула соединений с БД."""
+    return pool_status()
+
+
+# ------- GET /health/live -------
+@router.get("/health/live")
+async def health_live():
+    """Процесс жив и обслуживает event loop."""
+    return {"status": "ok"}
+
+
+# ------- GET /health/ready -------
+@router.get("/health/ready")
+async def health_ready(request: Request):
+    """Воркер закончил старт и видит БД; до этого балансировщик не шлёт трафик."""
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    try:
+        await asyncio.wait_for(check_db(), HEALTH_DB_TIMEOUT)
+    except Exception as e:
+        logger.warning("Проверка готовности: БД недоступна: %s", e)
+        return JSONResponse(status_code=503, content={"status": "unavailable", "database": "error"})
+    return {"status": "ok", "database": "ok"}
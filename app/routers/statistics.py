@@ -1,68 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from datetime import datetime
+
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.logger import logger
 from app.database import get_session
 from app.models import (User, Statistics, StatisticsRead, GameResult, DuelResult, 
-GameStatisticsResponse, DuelStatisticsResponse)
+GameStatisticsResponse, DuelStatisticsResponse, ProcessedResult, StatisticsBatch,
+StatisticsBatchResponse, LeaderboardResponse, RankResponse)
 
-from app.routers.helper import get_current_user
+from app.routers.helper import get_current_user, get_current_user_read
+from app.db_helpers import STATISTICS_COUNTERS, dialect_insert, increment_statistics
+from app.stats_buffer import STATS_WRITE_BEHIND, stats_buffer
+from app.leaderboard import leaderboards, key_score
+from app.etag import make_etag, not_modified, set_etag
+from app.replicas import get_read_session
 
 router = APIRouter()
 security = HTTPBearer()
 
+# Максимум результатов в одном POST /statistics/batch
+STATISTICS_BATCH_MAX = int(os.getenv("STATISTICS_BATCH_MAX", "500"))
+# Жёсткий предел размера страницы лидерборда
+LEADERBOARD_PAGE_MAX = int(os.getenv("LEADERBOARD_PAGE_MAX", "100"))
+
+LeaderboardName = Literal["games", "duels", "winrate"]
+
+
+def _with_pending(stats: Statistics) -> Statistics:
+    """Добавить к строке из БД ещё не сброшенные приращения write-behind буфера."""
+    if not STATS_WRITE_BEHIND:
+        return stats
+    pending = stats_buffer.pending(stats.user_id)
+    return Statistics(
+        user_id=stats.user_id,
+        version=stats.version,
+        **{col: getattr(stats, col) + pending[col] for col in STATISTICS_COUNTERS}
+    )
+
+
+def _statistics_etag(user_id: int, version: Optional[int]) -> str:
+    # Строки ещё нет: версия отлична от 0, которую получит только что вставленная строка
+    parts = [user_id, "empty" if version is None else version]
+    if STATS_WRITE_BEHIND:
+        # Несброшенные приращения процесса тоже меняют ответ
+        pending = stats_buffer.pending(user_id)
+        if any(pending.values()):
+            parts.append(".".join(str(pending[col]) for col in STATISTICS_COUNTERS))
+    return make_etag("stats", *parts)
+
+
+async def _record_result(session: AsyncSession, user_id: int, **deltas: int) -> Statistics:
+    """Учесть результат сразу в БД или, в write-behind режиме, в буфере процесса."""
+    if not STATS_WRITE_BEHIND:
+        # Один атомарный UPDATE ... RETURNING (строка создаётся, если её нет)
+        stats = await increment_statistics(session, user_id, **deltas)
+    else:
+        stats_buffer.add(user_id, **deltas)
+        stats = (await session.exec(
+            select(Statistics).where(Statistics.user_id == user_id)
+        )).first()
+        stats = _with_pending(stats or Statistics(user_id=user_id, games=0, games_won=0, duels=0, duels_won=0))
+
+    leaderboards.update(stats)
+    return stats
+
+
 # ------- GET /statistics -------
 @router.get("/", response_model=StatisticsRead)
-def get_statistics(
-    session: Session = Depends(get_session),
-    current_user: User = Depends(get_current_user)
+async def get_statistics(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+    current_user: User = Depends(get_current_user_read)
 ):
-    stats = session.exec(
+    """Счётчики текущего пользователя. Только чтение — может обслуживаться репликой."""
+    if request.headers.get("if-none-match"):
+        # Для проверки достаточно одной колонки version, без чтения всей строки
+        version = (await session.exec(
+            select(Statistics.version).where(Statistics.user_id == current_user.id)
+        )).first()
+        cached = not_modified(request, response, _statistics_etag(current_user.id, version), "private, no-cache")
+        if cached is not None:
+            return cached
+
+    stats = (await session.exec(
         select(Statistics).where(Statistics.user_id == current_user.id)
-    ).first()
+    )).first()
 
+    logger.info("Получена статистика для пользователя %s", current_user.email)
+    set_etag(response, _statistics_etag(current_user.id, stats.version if stats else None), "private, no-cache")
     if not stats:
-        # Если нет статистики — создаём пустую
-        stats = Statistics(user_id=current_user.id)
-        session.add(stats)
-        session.commit()
-        session.refresh(stats)
-
-    logger.info(f"Получена статистика для пользователя {current_user.email}")
-    return stats
+        # Строка появится при первом результате (UPSERT), а пока — нули
+        stats = Statistics(user_id=current_user.id, games=0, games_won=0, duels=0, duels_won=0)
+    return _with_pending(stats)
 
 # ------- POST /statistics/game -------
 @router.post("/game", response_model=GameStatisticsResponse)
 async def update_game_result(
     game_result: GameResult,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     """Обновить статистику после игры"""
-    
-    # Находим статистику пользователя
-    statement = select(Statistics).where(Statistics.user_id == current_user.id)
-    stats = session.exec(statement).first()
-    
-    if not stats:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"Статистика для пользователя {current_user.email} не найдена"
-        )
-    
-    # Увеличиваем счетчик игр
-    stats.games += 1
-    
-    # Если выиграл, увеличиваем счетчик побед
-    if game_result.won:
-        stats.games_won += 1
-    
-    session.add(stats)
-    session.commit()
-    session.refresh(stats)
-    
-    logger.info(f"Обновлена статистика для пользователя {current_user.email}")
+
+    stats = await _record_result(
+        session, current_user.id, games=1, games_won=int(game_result.won)
+    )
+
+    logger.info("Обновлена статистика для пользователя %s", current_user.email)
     return {
         "message": "Статистика игры обновлена",
         "user_email": current_user.email,
@@ -75,34 +126,109 @@ async def update_game_result(
 async def update_duel_result(
     duel_result: DuelResult,
     current_user: User = Depends(get_current_user),
-    session: Session = Depends(get_session)
+    session: AsyncSession = Depends(get_session)
 ):
     """Обновить статистику после дуэли"""
-    
-    # Находим статистику пользователя
-    statement = select(Statistics).where(Statistics.user_id == current_user.id)
-    stats = session.exec(statement).first()
-    
-    if not stats:
-        raise HTTPException(
-            status_code=404, 
-            detail=f"Статистика для пользователя {current_user.email} не найдена"
-        )
-    
-    # Увеличиваем счетчик дуэлей
-    stats.duels += 1
-    
-    # Если выиграл, увеличиваем счетчик побед
-    if duel_result.won:
-        stats.duels_won += 1
-    
-    session.add(stats)
-    session.commit()
-    session.refresh(stats)
-    
+
+    stats = await _record_result(
+        session, current_user.id, duels=1, duels_won=int(duel_result.won)
+    )
+
     return {
         "message": "Статистика дуэли обновлена",
         "user_email": current_user.email,
         "duels": stats.duels,
         "duels_won": stats.duels_won
     }
+
+# ------- POST /statistics/batch -------
+@router.post("/batch", response_model=StatisticsBatchResponse)
+async def update_batch_results(
+    batch: StatisticsBatch,
+    current_user: User = Depends(get_current_user),
+    session: AsyncSession = Depends(get_session)
+):
+    """Применить пачку результатов игр и дуэлей одной транзакцией.
+
+    Каждый результат несёт id клиента: повторно присланные id пропускаются,
+    поэтому пачку можно безопасно переотправить после обрыва связи.
+    """
+    if len(batch.results) > STATISTICS_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Слишком много результатов, максимум {STATISTICS_BATCH_MAX}"
+        )
+
+    # Повторы внутри самой пачки
+    results = {item.id: item for item in batch.results}
+
+    applied = []
+    if results:
+        insert = dialect_insert(session)
+        stmt = insert(ProcessedResult).values([
+            {"user_id": current_user.id, "client_id": client_id, "created_at": datetime.utcnow()}
+            for client_id in results
+        ]).on_conflict_do_nothing(
+            index_elements=[ProcessedResult.user_id, ProcessedResult.client_id]
+        ).returning(ProcessedResult.client_id)
+        applied = (await session.exec(stmt)).scalars().all()
+
+    deltas = {"games": 0, "games_won": 0, "duels": 0, "duels_won": 0}
+    for client_id in applied:
+        item = results[client_id]
+        deltas[f"{item.type}s"] += 1
+        deltas[f"{item.type}s_won"] += int(item.won)
+
+    # Один агрегированный UPSERT на пользователя и общий коммит
+    stats = await increment_statistics(session, current_user.id, commit=False, **deltas)
+    await session.commit()
+    stats = _with_pending(stats)
+    leaderboards.update(stats)
+
+    logger.info(
+        "Пакетное обновление статистики %s: применено %s, повторов %s",
+        current_user.email, len(applied), len(batch.results) - len(applied)
+    )
+    return {
+        "message": "Статистика обновлена",
+        "user_email": current_user.email,
+        "applied": len(applied),
+        "duplicates": len(batch.results) - len(applied),
+        "games": stats.games,
+        "games_won": stats.games_won,
+        "duels": stats.duels,
+        "duels_won": stats.duels_won,
+    }
+
+# ------- GET /statistics/leaderboard -------
+@router.get("/leaderboard", response_model=LeaderboardResponse)
+async def get_leaderboard(
+    board: LeaderboardName = "games",
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1),
+):
+    """Топ игроков из лидерборда в памяти, без запроса к БД."""
+    limit = min(limit, LEADERBOARD_PAGE_MAX)
+    leaderboard = leaderboards.boards[board]
+    return {
+        "board": board,
+        "total": len(leaderboard),
+        "items": [
+            {"rank": rank, "user_id": key[-1], "score": key_score(key)}
+            for rank, key in leaderboard.page(offset, limit)
+        ],
+    }
+
+# ------- GET /statistics/rank -------
+@router.get("/rank", response_model=RankResponse)
+async def get_rank(
+    board: LeaderboardName = "games",
+    current_user: User = Depends(get_current_user),
+):
+    """Место текущего пользователя в лидерборде."""
+    leaderboard = leaderboards.boards[board]
+    found = leaderboard.rank(current_user.id)
+    if found is None:
+        return {"board": board, "total": len(leaderboard)}
+    rank, key = found
+    return {"board": board, "total": len(leaderboard), "rank": rank, "score": key_score(key)}
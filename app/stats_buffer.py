@@ -0,0 +1,106 @@
+# Write-behind буфер приращений статистики.
+import asyncio
+import os
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from .database import async_session_maker
+from .logger import logger
+from .db_helpers import STATISTICS_COUNTERS, statistics_upsert
+
+load_dotenv()
+
+# 1 — копить приращения в памяти процесса и сбрасывать пачками
+STATS_WRITE_BEHIND = os.getenv("STATS_WRITE_BEHIND", "0") == "1"
+# Период сброса, секунды, и число пользователей в буфере, при котором сброс идёт сразу
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "1.0"))
+STATS_FLUSH_SIZE = int(os.getenv("STATS_FLUSH_SIZE", "1000"))
+
+
+class StatisticsBuffer:
+    """Приращения счётчиков по user_id, сбрасываемые одним многострочным UPSERT.
+
+    Буфер локален для процесса: другие воркеры увидят приращения только
+    после сброса, т.е. не позже чем через STATS_FLUSH_INTERVAL.
+    """
+
+    def __init__(self, interval: float = STATS_FLUSH_INTERVAL, max_users: int = STATS_FLUSH_SIZE,
+                 session_maker=async_session_maker):
+        self.interval = interval
+        self.max_users = max_users
+        self.session_maker = session_maker
+        self.flushes = 0
+        self._pending: Dict[int, Dict[str, int]] = {}
+        # Снимок, который сейчас пишется в БД: до коммита он всё ещё «несброшенный»
+        self._flushing: Dict[int, Dict[str, int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def add(self, user_id: int, **deltas: int) -> None:
+        row = self._pending.setdefault(user_id, dict.fromkeys(STATISTICS_COUNTERS, 0))
+        for col, value in deltas.items():
+            row[col] += value
+        if len(self._pending) >= self.max_users:
+            self._wakeup.set()
+
+    def pending(self, user_id: int) -> Dict[str, int]:
+        """Ещё не записанные приращения пользователя (нули, если их нет), включая идущий сброс."""
+        queued = self._pending.get(user_id)
+        flushing = self._flushing.get(user_id)
+        return {col: (queued[col] if queued else 0) + (flushing[col] if flushing else 0)
+                for col in STATISTICS_COUNTERS}
+
+    async def flush(self) -> int:
+        """Записать накопленное одним запросом, вернуть число пользователей."""
+        async with self._lock:
+            if not self._pending:
+                return 0
+            snapshot, self._pending = self._pending, {}
+            self._flushing = snapshot
+            rows = [{"user_id": user_id, **deltas} for user_id, deltas in snapshot.items()]
+            try:
+                async with self.session_maker() as session:
+                    await session.exec(statistics_upsert(session, rows))
+                    await session.commit()
+                    # Сразу после коммита: теперь приращения видны в БД
+                    self._flushing = {}
+            except Exception:
+                # Возвращаем приращения в буфер, чтобы не потерять их
+                self._flushing = {}
+                for user_id, deltas in snapshot.items():
+                    self.add(user_id, **deltas)
+                raise
+            self.flushes += 1
+            return len(rows)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Остановить таймер и сбросить всё, что осталось в буфере."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error("Ошибка сброса буфера статистики: %s", e)
+
+
+stats_buffer = StatisticsBuffer()
@@ -0,0 +1,204 @@
+# Периодические фоновые чистки БД небольшими пачками.
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, insert, update
+from sqlmodel import select
+
+from .database import async_session_maker
+from .etag import DUELS_VERSION, bump_table_version
+from .events import publish_duel_event
+from .logger import logger
+from .models import DUEL_ACTIVE, DUEL_EXPIRED, DUEL_FINISHED, DUEL_OPEN, Duel, DuelHistory, ProcessedResult, User
+
+load_dotenv()
+
+VERIFICATION_SWEEP_INTERVAL = float(os.getenv("VERIFICATION_SWEEP_INTERVAL", "300"))
+VERIFICATION_SWEEP_BATCH = int(os.getenv("VERIFICATION_SWEEP_BATCH", "1000"))
+
+DUEL_REAPER_INTERVAL = float(os.getenv("DUEL_REAPER_INTERVAL", "60"))
+DUEL_REAPER_BATCH = int(os.getenv("DUEL_REAPER_BATCH", "500"))
+# Открытая дуэль без соперника истекает через столько секунд
+DUEL_OPEN_TTL = float(os.getenv("DUEL_OPEN_TTL", "3600"))
+# Начатая дуэль без результата считается брошенной и истекает через столько секунд после join
+DUEL_ACTIVE_TTL = float(os.getenv("DUEL_ACTIVE_TTL", "86400"))
+# Завершённые дуэли уезжают в duel_history через столько секунд
+DUEL_FINISHED_TTL = float(os.getenv("DUEL_FINISHED_TTL", "604800"))
+# archive — истёкшие дуэли тоже в duel_history, delete — просто удалить
+DUEL_EXPIRED_MODE = os.getenv("DUEL_EXPIRED_MODE", "archive")
+
+PROCESSED_RESULT_SWEEP_INTERVAL = float(os.getenv("PROCESSED_RESULT_SWEEP_INTERVAL", "3600"))
+PROCESSED_RESULT_SWEEP_BATCH = int(os.getenv("PROCESSED_RESULT_SWEEP_BATCH", "5000"))
+# Окно дедупликации POST /statistics/batch: повтор старше этого будет учтён заново
+PROCESSED_RESULT_TTL = float(os.getenv("PROCESSED_RESULT_TTL", "604800"))
+
+
+class PeriodicTask:
+    """Запускать корутину каждые interval секунд, пока задача не остановлена."""
+
+    def __init__(self, name: str, interval: float, func: Callable[[], Awaitable[int]]):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                processed = await self.func()
+                if processed:
+                    logger.info("%s: обработано строк %s", self.name, processed)
+            except Exception as e:
+                logger.error("%s: ошибка %s", self.name, e)
+
+
+async def sweep_expired_verification_tokens(batch: int = VERIFICATION_SWEEP_BATCH,
+                                            session_maker=async_session_maker) -> int:
+    """Обнулить просроченные токены подтверждения, по batch строк за транзакцию.
+
+    Короткие транзакции не держат блокировки на таблице user подолгу.
+    """
+    total = 0
+    while True:
+        expired = (
+            select(User.id)
+            .where(User.verification_expire < datetime.utcnow())
+            .limit(batch)
+        )
+        async with session_maker() as session:
+            result = await session.exec(
+                update(User)
+                .where(User.id.in_(expired))
+                .values(verification_token_hash=None, verification_expire=None)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        total += result.rowcount
+        if result.rowcount < batch:
+            return total
+
+
+async def sweep_processed_results(batch: int = PROCESSED_RESULT_SWEEP_BATCH,
+                                  session_maker=async_session_maker) -> int:
+    """Удалить id результатов старше окна дедупликации, по batch строк за транзакцию."""
+    older_than = datetime.utcnow() - timedelta(seconds=PROCESSED_RESULT_TTL)
+    total = 0
+    while True:
+        stale = (
+            select(ProcessedResult.id)
+            .where(ProcessedResult.created_at < older_than)
+            .limit(batch)
+        )
+        async with session_maker() as session:
+            result = await session.exec(
+                delete(ProcessedResult)
+                .where(ProcessedResult.id.in_(stale))
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        total += result.rowcount
+        if result.rowcount < batch:
+            return total
+
+
+async def move_duels(session_maker, status: str, older_than: datetime, batch: int,
+                     archive_status: Optional[str] = None, timestamp=Duel.created_at) -> List[Duel]:
+    """Убрать из duel до batch самых старых дуэлей в статусе status одной короткой транзакцией.
+
+    DELETE ... RETURNING и INSERT в duel_history идут в одной транзакции;
+    с archive_status=None строки просто удаляются. На Postgres уже
+    заблокированные строки (например, к дуэли как раз присоединяются)
+    пропускаются, а не ждут. Возраст дуэли считается по колонке timestamp.
+    """
+    async with session_maker() as session:
+        candidates = (
+            select(Duel.id)
+            .where(Duel.status == status, timestamp < older_than)
+            .order_by(timestamp)
+            .limit(batch)
+        )
+        if session.bind.dialect.name == "postgresql":
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        rows = (await session.exec(
+            delete(Duel)
+            # Повторная проверка статуса: дуэль могла смениться между выборкой и удалением
+            .where(Duel.id.in_(candidates.scalar_subquery()), Duel.status == status)
+            .returning(*Duel.__table__.columns)
+            .execution_options(synchronize_session=False)
+        )).all()
+        if not rows:
+            return []
+
+        if archive_status is not None:
+            archived_at = datetime.utcnow()
+            await session.exec(insert(DuelHistory).values([
+                {**row._mapping, "status": archive_status, "archived_at": archived_at} for row in rows
+            ]))
+        await bump_table_version(session, DUELS_VERSION)
+        await session.commit()
+    return [Duel(**row._mapping) for row in rows]
+
+
+async def reap_stale_duels(batch: int = DUEL_REAPER_BATCH, session_maker=async_session_maker) -> int:
+    """Истёкшие открытые и брошенные начатые дуэли — в историю (или удалить), старые завершённые — в историю."""
+    now = datetime.utcnow()
+    expired_status = DUEL_EXPIRED if DUEL_EXPIRED_MODE == "archive" else None
+    total = 0
+    stale = (
+        (DUEL_OPEN, now - timedelta(seconds=DUEL_OPEN_TTL), Duel.created_at),
+        (DUEL_ACTIVE, now - timedelta(seconds=DUEL_ACTIVE_TTL), Duel.joined_at),
+    )
+    for status, older_than, timestamp in stale:
+        while True:
+            expired = await move_duels(session_maker, status, older_than, batch, expired_status, timestamp)
+            for duel in expired:
+                duel.status = DUEL_EXPIRED
+                await publish_duel_event("expired", duel)
+            total += len(expired)
+            if len(expired) < batch:
+                break
+    while True:
+        finished = await move_duels(session_maker, DUEL_FINISHED, now - timedelta(seconds=DUEL_FINISHED_TTL),
+                                    batch, DUEL_FINISHED)
+        total += len(finished)
+        if len(finished) < batch:
+            return total
+
+
+duel_reaper = PeriodicTask(
+    "Очистка устаревших дуэлей",
+    DUEL_REAPER_INTERVAL,
+    reap_stale_duels,
+)
+
+
+verification_sweeper = PeriodicTask(
+    "Очистка просроченных токенов подтверждения",
+    VERIFICATION_SWEEP_INTERVAL,
+    sweep_expired_verification_tokens,
+)
+
+
+processed_result_sweeper = PeriodicTask(
+    "Очистка старых id пакетных результатов",
+    PROCESSED_RESULT_SWEEP_INTERVAL,
+    sweep_processed_results,
+)
@@ -1,15 +1,20 @@
 # Пароли + JWT.
+import asyncio
+import hashlib
 import secrets
 import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from dotenv import load_dotenv
 
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 
-import smtplib
-from email.mime.text import MIMEText
+from app.logger import logger
+from app.mailer import EmailJob
+from app.metrics import PASSWORD_HASH_DURATION
 
 load_dotenv()
 
@@ -20,7 +25,23 @@ ALGORITHM = os.getenv("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES"))  
 
 # Используем pbkdf2_sha256 чтобы избежать проблем с bcrypt на Windows
-pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+PBKDF2_ROUNDS = int(os.getenv("PBKDF2_ROUNDS", "29000"))
+pwd_context = CryptContext(
+    schemes=["pbkdf2_sha256"], deprecated="auto", pbkdf2_sha256__rounds=PBKDF2_ROUNDS
+)
+
+# Пул процессов для хэширования: 0 — считать в threadpool текущего процесса
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(os.cpu_count() or 1)))
+# Сколько задач хэширования может ждать одновременно, дальше — 503
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", "64"))
+
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_pending = 0
+
+
+class PasswordHashBusy(Exception):
+    """Очередь хэширования переполнена — запрос нужно отклонить (503)."""
+
 
 def hash_password(password: str) -> str:
     """Вернуть хэш пароля."""
@@ -30,6 +51,61 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Проверить plain -> hashed."""
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Проверить пароль и вернуть новый хэш, если сменились параметры (rounds)."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+def _get_hash_executor() -> Optional[ProcessPoolExecutor]:
+    global _hash_executor
+    if _hash_executor is None and HASH_WORKERS > 0:
+        _hash_executor = ProcessPoolExecutor(max_workers=HASH_WORKERS)
+    return _hash_executor
+
+
+def _reset_hash_executor(broken: ProcessPoolExecutor) -> None:
+    """Забыть сломанный пул; параллельные задачи могли уже заменить его новым."""
+    global _hash_executor
+    if _hash_executor is broken:
+        _hash_executor = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_hash_executor() -> None:
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True, cancel_futures=True)
+        _hash_executor = None
+
+
+async def _run_hash_job(operation: str, func, *args):
+    """Выполнить CPU-тяжёлую функцию в пуле, не допуская очереди больше HASH_MAX_PENDING."""
+    global _hash_pending
+    if _hash_pending >= HASH_MAX_PENDING:
+        raise PasswordHashBusy()
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        with PASSWORD_HASH_DURATION.time(operation):
+            # Упавший процесс пула ломает весь пул: пересоздаём его и пробуем ещё раз
+            for attempt in range(2):
+                executor = _get_hash_executor()
+                try:
+                    return await loop.run_in_executor(executor, func, *args)
+                except BrokenProcessPool:
+                    _reset_hash_executor(executor)
+                    logger.error("Пул хэширования паролей сломан, пересоздаём (попытка %s)", attempt + 1)
+            raise PasswordHashBusy()
+    finally:
+        _hash_pending -= 1
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hash_job("hash", hash_password, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await _run_hash_job("verify", verify_and_update_password, plain_password, hashed_password)
+
 def create_access_token(data: Dict[str, Any], expires_minutes: Optional[int] = None) -> str:
     """Создать JWT-token с payload = data. Автоматически добавляет exp."""
     to_encode = data.copy()
@@ -51,24 +127,17 @@ def create_verification_token():
     expires = datetime.utcnow() + timedelta(minutes=30)
     return token, expires
 
+def hash_verification_token(token: str) -> str:
+    """sha256 токена подтверждения — то, что хранится и ищется в БД."""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
-def send_verification_email(email: str, token: str):
-    try:
-        smtp_user = os.getenv("SMTP_USER")
-        smtp_pass = os.getenv("SMTP_PASS")
-        
-        if not smtp_user or not smtp_pass:
-            print("SMTP credentials not configured properly")
-            return False
-        
-        # Проверяем, что это Gmail
-        if "gmail.com" not in smtp_user:
-            print("Warning: Using Gmail SMTP with non-Gmail account")
-        
-        verification_url = f"http://localhost:5173/geo-guess-grid/verify?token={token}"
-        
-        subject = "Verify your email address"
-        body = f"""
+
+def verification_email(email: str, token: str) -> EmailJob:
+    """Письмо с подтверждением email для очереди outbox."""
+    verification_url = f"http://localhost:5173/geo-guess-grid/verify?token={token}"
+
+    subject = "Verify your email address"
+    body = f"""
         Hello!
         
         Please verify your email address by clicking the link below:
@@ -81,31 +150,4 @@ def send_verification_email(email: str, token: str):
         
         If you didn't create an account, please ignore this email.
         """
-        
-        msg = MIMEText(body)
-        msg["Subject"] = subject
-        msg["From"] = smtp_user
-        msg["To"] = email
-        
-        print(f"Attempting to send email to {email} via {smtp_user}")
-        
-        with smtplib.SMTP("smtp.gmail.com", 587) as server:
-            server.ehlo()
-            server.starttls()  # Обязательно для Gmail
-            server.ehlo()
-            server.login(smtp_user, smtp_pass)
-            server.sendmail(smtp_user, email, msg.as_string())
-        
-        print(f"✓ Verification email sent successfully to {email}")
-        return True
-        
-    except smtplib.SMTPAuthenticationError as e:
-        print(f"✗ SMTP Authentication failed: {e}")
-        print("Please check:")
-        print("1. 2-Step Verification is enabled")
-        print("2. App Password is generated correctly")
-        print("3. SMTP_PASS is the 16-character app password")
-        return False
-    except Exception as e:
-        print(f"✗ Failed to send email: {e}")
-        return False
+    return EmailJob(to=email, subject=subject, body=body)
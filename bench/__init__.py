@@ -0,0 +1 @@
+# Бенчмарки API. Запуск: python -m bench.<модуль>
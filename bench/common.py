@@ -0,0 +1,83 @@
+"""Общие части бенчмарков: окружение, перцентили, JSON-отчёт."""
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence
+
+
+def bench_env(prefix: str = "bench-") -> str:
+    """Значения env по умолчанию для прогона без .env: временная SQLite, тихий лог.
+
+    Вызывать до импорта app.*; заданные в окружении значения (например,
+    DATABASE_URL на локальный Postgres) не перезаписываются.
+    """
+    tmpdir = tempfile.mkdtemp(prefix=prefix)
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{tmpdir}/bench.db")
+    os.environ.setdefault("JWT_SECRET", "bench")
+    os.environ.setdefault("ALGORITHM", "HS256")
+    os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+    os.environ.setdefault("LOG_LEVEL", "ERROR")
+    os.environ.setdefault("LOG_FILE", os.path.join(tmpdir, "app.log"))
+    return tmpdir
+
+
+def percentile(sorted_samples: Sequence[float], q: float) -> float:
+    """Перцентиль q (0..100) по уже отсортированной выборке, с интерполяцией."""
+    if not sorted_samples:
+        return 0.0
+    position = (len(sorted_samples) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_samples) - 1)
+    return sorted_samples[lower] + (sorted_samples[upper] - sorted_samples[lower]) * (position - lower)
+
+
+def latency_summary(samples: List[float], elapsed: Optional[float] = None, errors: int = 0) -> Dict:
+    """Сводка по задержкам (секунды на входе, миллисекунды в отчёте)."""
+    ordered = sorted(samples)
+    summary = {
+        "count": len(ordered),
+        "errors": errors,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3) if ordered else 0.0,
+    }
+    if elapsed:
+        summary["seconds"] = round(elapsed, 4)
+        summary["throughput_rps"] = round(len(ordered) / elapsed, 1)
+    return summary
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment() -> Dict:
+    """Откуда результаты: коммит, интерпретатор, машина, время прогона."""
+    return {
+        "commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+
+
+def write_report(result: Dict, out: Optional[str]) -> None:
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if out:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
@@ -0,0 +1,57 @@
+"""Сравнение двух JSON-отчётов bench.api / bench.micro (например, до и после коммита).
+
+    python -m bench.compare base.json new.json --threshold 10
+
+Код выхода 1, если какой-то p50/p95/p99 вырос больше чем на threshold процентов.
+"""
+import argparse
+import json
+import sys
+from typing import Dict
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def flatten(report: Dict) -> Dict[str, Dict]:
+    """Плоский словарь «сценарий[/эндпоинт] -> сводка» для обоих видов отчётов."""
+    rows = {}
+    for name, summary in report.get("scenarios", {}).items():
+        rows[name] = summary
+        for label, endpoint in summary.get("endpoints", {}).items():
+            rows[f"{name} / {label}"] = endpoint
+    rows.update(report.get("results", {}))
+    return rows
+
+
+def compare(base: Dict, new: Dict, threshold: float) -> int:
+    base_rows, new_rows = flatten(base), flatten(new)
+    print(f"base {base['environment'].get('commit')}  ->  new {new['environment'].get('commit')}")
+    regressions = 0
+    for name in sorted(base_rows.keys() & new_rows.keys()):
+        cells = []
+        for metric in METRICS:
+            old, cur = base_rows[name].get(metric), new_rows[name].get(metric)
+            if not old or cur is None:
+                continue
+            change = (cur - old) / old * 100
+            mark = ""
+            if change > threshold:
+                mark = " !"
+                regressions += 1
+            cells.append(f"{metric[:-3]} {old:.3f}->{cur:.3f} ({change:+.1f}%){mark}")
+        print(f"{name:45} " + "  ".join(cells))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="допустимый рост задержки, %%")
+    args = parser.parse_args()
+
+    with open(args.base, encoding="utf-8") as f:
+        base_report = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new_report = json.load(f)
+    sys.exit(compare(base_report, new_report, args.threshold))
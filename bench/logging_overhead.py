@@ -0,0 +1,67 @@
+"""Стоимость logger.info на стороне вызывающего: синхронные хендлеры против очереди.
+
+    python -m bench.logging_overhead --records 20000
+"""
+import argparse
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import tempfile
+import time
+
+from app.logger import ThreadQueueHandler
+
+
+def _measure(logger: logging.Logger, records: int) -> float:
+    started = time.perf_counter()
+    for i in range(records):
+        logger.info("Пользователь %s присоединился к дуэли %s", i, i + 1)
+    return time.perf_counter() - started
+
+
+def main(records: int) -> dict:
+    tmpdir = tempfile.mkdtemp(prefix="bench-log-")
+    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+    results = {}
+
+    # Как было: FileHandler прямо на пути запроса
+    sync_logger = logging.getLogger("bench.sync")
+    sync_logger.propagate = False
+    file_handler = logging.FileHandler(os.path.join(tmpdir, "sync.log"), encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    sync_logger.addHandler(file_handler)
+    sync_logger.setLevel(logging.INFO)
+    results["sync_file"] = _measure(sync_logger, records)
+    file_handler.close()
+
+    # Как стало: QueueHandler, запись в файл в потоке QueueListener
+    queued_logger = logging.getLogger("bench.queue")
+    queued_logger.propagate = False
+    log_queue = queue.SimpleQueue()
+    queued_logger.addHandler(ThreadQueueHandler(log_queue))
+    queued_logger.setLevel(logging.INFO)
+    file_handler = logging.FileHandler(os.path.join(tmpdir, "queue.log"), encoding="utf-8")
+    file_handler.setFormatter(formatter)
+    listener = logging.handlers.QueueListener(log_queue, file_handler)
+    listener.start()
+    results["queue"] = _measure(queued_logger, records)
+    listener.stop()
+    file_handler.close()
+
+    return {
+        "benchmark": "logging_overhead",
+        "records": records,
+        "runs": [
+            {"mode": mode, "seconds": round(elapsed, 4), "us_per_record": round(elapsed / records * 1e6, 2)}
+            for mode, elapsed in results.items()
+        ],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(main(args.records), ensure_ascii=False, indent=2))
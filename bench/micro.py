@@ -0,0 +1,112 @@
+"""Микробенчмарки горячих функций без HTTP и БД.
+
+    python -m bench.micro --out micro.json
+    python -m bench.micro --only jwt
+
+Хэширование пароля, выпуск и проверка JWT, сериализация ответов: через
+jsonable_encoder + json.dumps (FastAPI без response_model), через pydantic
+напрямую и путём GET /duels (response_model + ORJSONResponse).
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
+from bench.common import bench_env, environment, latency_summary, write_report
+
+bench_env("bench-micro-")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import ORJSONResponse  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.models import Duel, DuelRead, User, UserRead  # noqa: E402
+from app.utils import (  # noqa: E402
+    PBKDF2_ROUNDS,
+    create_access_token,
+    decode_token,
+    hash_password,
+    verify_password,
+)
+
+
+def measure(func: Callable[[], object], seconds: float, inner: int) -> Dict:
+    """Вызывать func пачками по inner раз в течение seconds; выборка — время на вызов."""
+    samples: List[float] = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline or len(samples) < 5:
+        started = time.perf_counter()
+        for _ in range(inner):
+            func()
+        samples.append((time.perf_counter() - started) / inner)
+    summary = latency_summary(samples)
+    summary["calls"] = len(samples) * inner
+    summary["ops_per_sec"] = round(1 / (sum(samples) / len(samples)), 1)
+    return summary
+
+
+def password_cases() -> Dict[str, tuple]:
+    hashed = hash_password("bench-password")
+    return {
+        "hash_password": (lambda: hash_password("bench-password"), 1),
+        "verify_password": (lambda: verify_password("bench-password", hashed), 1),
+    }
+
+
+def jwt_cases() -> Dict[str, tuple]:
+    token = create_access_token({"sub": "bench@example.com"})
+    return {
+        "create_access_token": (lambda: create_access_token({"sub": "bench@example.com"}), 200),
+        "decode_token": (lambda: decode_token(token), 200),
+    }
+
+
+def serialization_cases() -> Dict[str, tuple]:
+    user = User(id=1, email="bench@example.com", hashed_password="x", is_verified=True)
+    duels = [Duel(id=i, creator_id=i, join_id=i + 1 if i % 2 else None) for i in range(1, 51)]
+    duels_adapter = TypeAdapter(List[Duel])
+    # Путь GET /duels: response_model=List[DuelRead] + ORJSONResponse
+    read_adapter = TypeAdapter(List[DuelRead])
+
+    def duels_response():
+        validated = read_adapter.validate_python(duels, from_attributes=True)
+        return ORJSONResponse(read_adapter.dump_python(validated, mode="json")).body
+
+    return {
+        "user_read_jsonable": (lambda: json.dumps(jsonable_encoder(UserRead.model_validate(user))), 500),
+        "user_read_pydantic": (lambda: UserRead.model_validate(user).model_dump_json(), 500),
+        "duels_50_jsonable": (lambda: json.dumps(jsonable_encoder(duels)), 20),
+        "duels_50_pydantic": (lambda: duels_adapter.dump_json(duels), 20),
+        "duels_50_response": (duels_response, 20),
+    }
+
+
+GROUPS = {
+    "password": password_cases,
+    "jwt": jwt_cases,
+    "serialization": serialization_cases,
+}
+
+
+def main(args) -> Dict:
+    report = {
+        "benchmark": "micro",
+        "environment": environment(),
+        "params": {"seconds": args.seconds, "pbkdf2_rounds": PBKDF2_ROUNDS},
+        "results": {},
+    }
+    for group in args.only or list(GROUPS):
+        for name, (func, inner) in GROUPS[group]().items():
+            report["results"][name] = measure(func, args.seconds, inner)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", action="append", choices=list(GROUPS),
+                        help="группа бенчмарков; можно указать несколько раз")
+    parser.add_argument("--seconds", type=float, default=1.0, help="длительность замера одной функции")
+    parser.add_argument("--out", help="куда записать JSON-отчёт")
+    args = parser.parse_args()
+
+    write_report(main(args), args.out)
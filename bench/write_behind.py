@@ -0,0 +1,116 @@
+"""Сравнение записи статистики: сразу в БД против write-behind буфера.
+
+    python -m bench.write_behind --users 200 --results 20000 --out wb.json
+
+По умолчанию использует временную SQLite-базу; DATABASE_URL из окружения
+позволяет прогнать то же самое на Postgres. Скрипт создаёт пользователей
+bench-N@example.com и трогает только их строки в user и statistics.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from bench.common import bench_env, write_report
+
+bench_env("bench-write-behind-")
+
+from sqlalchemy import event, delete  # noqa: E402
+from sqlmodel import SQLModel, select  # noqa: E402
+
+from app.database import async_session_maker, init_engines  # noqa: E402
+from app.models import User, Statistics  # noqa: E402
+from app.db_helpers import increment_statistics  # noqa: E402
+from app.stats_buffer import StatisticsBuffer  # noqa: E402
+
+
+class CommitCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "commit", self._on_commit)
+
+    def _on_commit(self, conn):
+        self.count += 1
+
+
+async def setup(async_engine, users: int) -> list:
+    async with async_engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    bench_users = select(User.id).where(User.email.like("bench-%@example.com"))
+    async with async_session_maker() as session:
+        # Только строки бенчмарка: DATABASE_URL может указывать на живую базу
+        await session.exec(delete(Statistics).where(Statistics.user_id.in_(bench_users)))
+        await session.exec(delete(User).where(User.id.in_(bench_users)))
+        session.add_all([User(email=f"bench-{i}@example.com", hashed_password="x") for i in range(users)])
+        await session.commit()
+        return list((await session.exec(bench_users)).all())
+
+
+async def run_direct(user_ids, results, concurrency):
+    async def worker(n):
+        for _ in range(n):
+            async with async_session_maker() as session:
+                await increment_statistics(session, random.choice(user_ids), games=1,
+                                           games_won=random.randint(0, 1))
+
+    per_worker = results // concurrency
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    return per_worker * concurrency
+
+
+async def run_write_behind(user_ids, results, concurrency, interval):
+    buffer = StatisticsBuffer(interval=interval)
+    buffer.start()
+
+    async def worker(n):
+        for _ in range(n):
+            buffer.add(random.choice(user_ids), games=1, games_won=random.randint(0, 1))
+            await asyncio.sleep(0)
+
+    per_worker = results // concurrency
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    await buffer.stop()
+    return per_worker * concurrency
+
+
+async def measure(name, coro_factory, counter):
+    commits_before = counter.count
+    started = time.perf_counter()
+    applied = await coro_factory()
+    elapsed = time.perf_counter() - started
+    commits = counter.count - commits_before
+    return {
+        "mode": name,
+        "results": applied,
+        "seconds": round(elapsed, 4),
+        "results_per_sec": round(applied / elapsed, 1),
+        "commits": commits,
+        "commits_per_sec": round(commits / elapsed, 1),
+    }
+
+
+async def main(args):
+    async_engine = init_engines()
+    user_ids = await setup(async_engine, args.users)
+    counter = CommitCounter(async_engine)
+    report = [
+        await measure("direct", lambda: run_direct(user_ids, args.results, args.concurrency), counter),
+        await measure("write_behind",
+                      lambda: run_write_behind(user_ids, args.results, args.concurrency, args.interval),
+                      counter),
+    ]
+    await async_engine.dispose()
+    return {"benchmark": "write_behind", "database": async_engine.url.get_backend_name(),
+            "users": args.users, "concurrency": args.concurrency, "runs": report}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--results", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--interval", type=float, default=0.2, help="период сброса буфера, с")
+    parser.add_argument("--out", help="куда записать JSON-отчёт")
+    args = parser.parse_args()
+
+    write_report(asyncio.run(main(args)), args.out)
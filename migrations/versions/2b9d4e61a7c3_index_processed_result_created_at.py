@@ -0,0 +1,16 @@
+from alembic import op
+import sqlalchemy as sa
+
+"""index processed_result.created_at for the retention sweeper"""
+
+revision = "2b9d4e61a7c3"
+down_revision = "8e3b5c7d9a21"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index("ix_processed_result_created_at", "processed_result", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_processed_result_created_at", table_name="processed_result")
@@ -0,0 +1,24 @@
+from alembic import op
+import sqlalchemy as sa
+
+"""add duel indexes for keyset pagination"""
+
+revision = "3c1d7a2e4b90"
+down_revision = "9f65ec0a89d3"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_index("ix_duel_creator_id", "duel", ["creator_id"])
+    op.create_index("ix_duel_join_id", "duel", ["join_id"])
+    op.create_index(
+        "ix_duel_open_id", "duel", ["id"],
+        postgresql_where=sa.text("join_id IS NULL"),
+        sqlite_where=sa.text("join_id IS NULL"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_duel_open_id", table_name="duel")
+    op.drop_index("ix_duel_join_id", table_name="duel")
+    op.drop_index("ix_duel_creator_id", table_name="duel")
@@ -0,0 +1,22 @@
+from alembic import op
+import sqlalchemy as sa
+
+"""add statistics.version and table_version for ETags"""
+
+revision = "6a2f9d14c3e8"
+down_revision = "d41a9c6e2f07"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("statistics", sa.Column("version", sa.Integer(), nullable=False, server_default="0"))
+    op.create_table(
+        "table_version",
+        sa.Column("name", sa.String(length=64), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("table_version")
+    op.drop_column("statistics", "version")
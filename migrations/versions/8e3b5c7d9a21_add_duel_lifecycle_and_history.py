@@ -0,0 +1,62 @@
+from alembic import op
+import sqlalchemy as sa
+
+"""add duel lifecycle columns and duel_history table"""
+
+revision = "8e3b5c7d9a21"
+down_revision = "6a2f9d14c3e8"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("duel", sa.Column("status", sa.String(length=16), nullable=False, server_default="open"))
+    op.add_column("duel", sa.Column("created_at", sa.DateTime(), nullable=True))
+    op.add_column("duel", sa.Column("joined_at", sa.DateTime(), nullable=True))
+    op.add_column("duel", sa.Column("finished_at", sa.DateTime(), nullable=True))
+
+    # Точного времени у старых дуэлей нет: считаем их созданными сейчас,
+    # чтобы уборщик не снёс все разом сразу после миграции
+    duel = sa.table(
+        "duel",
+        sa.column("join_id", sa.Integer),
+        sa.column("winner_id", sa.Integer),
+        sa.column("status", sa.String),
+        sa.column("created_at", sa.DateTime),
+        sa.column("joined_at", sa.DateTime),
+        sa.column("finished_at", sa.DateTime),
+    )
+    now = sa.func.current_timestamp()
+    op.execute(duel.update().values(created_at=now))
+    op.execute(duel.update().where(duel.c.join_id.is_not(None)).values(status="active", joined_at=now))
+    op.execute(duel.update().where(duel.c.winner_id.is_not(None)).values(status="finished", finished_at=now))
+
+    with op.batch_alter_table("duel") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+    op.create_index("ix_duel_status_created_at", "duel", ["status", "created_at"])
+
+    op.create_table(
+        "duel_history",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=False),
+        sa.Column("creator_id", sa.Integer(), nullable=False),
+        sa.Column("join_id", sa.Integer(), nullable=True),
+        sa.Column("winner_id", sa.Integer(), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("joined_at", sa.DateTime(), nullable=True),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_duel_history_creator_id", "duel_history", ["creator_id"])
+    op.create_index("ix_duel_history_join_id", "duel_history", ["join_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_duel_history_join_id", table_name="duel_history")
+    op.drop_index("ix_duel_history_creator_id", table_name="duel_history")
+    op.drop_table("duel_history")
+    op.drop_index("ix_duel_status_created_at", table_name="duel")
+    with op.batch_alter_table("duel") as batch:
+        batch.drop_column("finished_at")
+        batch.drop_column("joined_at")
+        batch.drop_column("created_at")
+        batch.drop_column("status")
@@ -0,0 +1,23 @@
+from alembic import op
+import sqlalchemy as sa
+
+"""add processed_result table for idempotent statistics batches"""
+
+revision = "b7e4f0c2d815"
+down_revision = "3c1d7a2e4b90"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.create_table(
+        "processed_result",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("user.id"), nullable=False),
+        sa.Column("client_id", sa.String(length=64), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("user_id", "client_id", name="uq_processed_result_user_client"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("processed_result")
@@ -0,0 +1,43 @@
+from alembic import op
+import hashlib
+import sqlalchemy as sa
+
+"""store verification token as indexed sha256 hash"""
+
+revision = "d41a9c6e2f07"
+down_revision = "b7e4f0c2d815"
+branch_labels = None
+depends_on = None
+
+def upgrade() -> None:
+    op.add_column("user", sa.Column("verification_token_hash", sa.String(length=64), nullable=True))
+
+    # Переносим ещё действующие токены: в БД остаётся только их хэш
+    user = sa.table(
+        "user",
+        sa.column("id", sa.Integer),
+        sa.column("verification_token", sa.String),
+        sa.column("verification_token_hash", sa.String),
+    )
+    bind = op.get_bind()
+    rows = bind.execute(
+        sa.select(user.c.id, user.c.verification_token).where(user.c.verification_token.is_not(None))
+    ).all()
+    for user_id, token in rows:
+        bind.execute(
+            user.update()
+            .where(user.c.id == user_id)
+            .values(verification_token_hash=hashlib.sha256(token.encode("utf-8")).hexdigest())
+        )
+
+    op.drop_column("user", "verification_token")
+    op.create_index("ix_user_verification_token_hash", "user", ["verification_token_hash"], unique=True)
+    op.create_index("ix_user_verification_expire", "user", ["verification_expire"])
+
+
+def downgrade() -> None:
+    # Исходные токены из хэша не восстановить — незавершённые подтверждения сбрасываются
+    op.drop_index("ix_user_verification_expire", table_name="user")
+    op.drop_index("ix_user_verification_token_hash", table_name="user")
+    op.add_column("user", sa.Column("verification_token", sa.String(), nullable=True))
+    op.drop_column("user", "verification_token_hash")
@@ -0,0 +1,79 @@
+import asyncio
+import itertools
+import os
+import tempfile
+from contextlib import AsyncExitStack
+from typing import Dict, Tuple
+
+# Окружение задаётся до импорта app.*: временная SQLite (TESTING=1 -> DATABASE_URL_TEST), без реплики
+_tmpdir = tempfile.mkdtemp(prefix="geo-guess-tests-")
+os.environ["TESTING"] = "1"
+os.environ.setdefault("DATABASE_URL_TEST", f"sqlite:///{_tmpdir}/test.db")
+os.environ.setdefault("JWT_SECRET", "test")
+os.environ.setdefault("ALGORITHM", "HS256")
+os.environ.setdefault("ACCESS_TOKEN_EXPIRE_MINUTES", "30")
+os.environ.setdefault("LOG_FILE", os.path.join(_tmpdir, "app.log"))
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("HASH_WORKERS", "0")
+os.environ.setdefault("INTERNAL_TOKEN", "test-internal")
+os.environ.setdefault("ADMIN_EMAILS", "admin@example.com")
+
+import httpx  # noqa: E402
+import pytest  # noqa: E402
+
+pytest_plugins = ["tests.query_budget_plugin"]
+
+PASSWORD = "secret-password"
+_emails = itertools.count(1)
+
+
+class Api:
+    """httpx-клиент к приложению с выполненным lifespan; вызовы синхронные, в своём event loop."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient):
+        self.loop = loop
+        self.client = client
+
+    def run(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return self.run(self.client.request(method, url, **kwargs))
+
+    def get(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> httpx.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def user(self, prefix: str = "player") -> Tuple[int, Dict[str, str]]:
+        """Зарегистрировать нового пользователя и войти: (id, заголовки с токеном)."""
+        email = f"{prefix}{next(_emails)}@example.com"
+        assert self.post("/auth/register", json={"email": email, "password": PASSWORD}).status_code == 200
+        token = self.post("/auth/login", json={"email": email, "password": PASSWORD}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        return self.get("/auth/me", headers=headers).json()["id"], headers
+
+
+@pytest.fixture(scope="session")
+def api():
+    """Одно приложение и один event loop на все тесты: синглтоны app.* (outbox, брокер,
+    буфер статистики) привязываются к циклу, в котором их впервые использовали."""
+    from app.main import app
+
+    loop = asyncio.new_event_loop()
+    stack = AsyncExitStack()
+
+    async def start() -> httpx.AsyncClient:
+        await stack.enter_async_context(app.router.lifespan_context(app))
+        return await stack.enter_async_context(
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test"))
+
+    try:
+        yield Api(loop, loop.run_until_complete(start()))
+    finally:
+        loop.run_until_complete(stack.aclose())
+        loop.close()
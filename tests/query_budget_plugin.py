@@ -0,0 +1,87 @@
+"""Плагин pytest: бюджет SQL-запросов на эндпоинт и поиск N+1.
+
+Подключение в conftest.py:
+
+    pytest_plugins = ["tests.query_budget_plugin"]
+
+Фикстура query_budget собирает запросы к БД каждого HTTP-запроса теста
+(через QueryCountMiddleware) и в конце теста падает, если эндпоинт вышел
+за бюджет из app.query_budget.QUERY_BUDGETS или повторил один и тот же
+запрос N_PLUS_ONE_THRESHOLD раз. Для кода вне HTTP:
+
+    with assert_max_queries(2):
+        await increment_statistics(session, user_id, games=1)
+
+assert_all_routes_budgeted() проверяет, что у каждого маршрута есть бюджет.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+import pytest
+
+from app.query_budget import (
+    QueryLog,
+    add_observer,
+    check_query_log,
+    missing_budgets,
+    remove_observer,
+    track_queries,
+)
+
+
+class QueryBudget:
+    """Журналы запросов всех HTTP-запросов теста."""
+
+    def __init__(self):
+        self.requests: List[Tuple[str, str, QueryLog]] = []
+
+    def __call__(self, method: str, route: str, log: QueryLog) -> None:
+        self.requests.append((method, route, log))
+
+    def problems(self) -> List[str]:
+        return [problem for method, route, log in self.requests
+                for problem in check_query_log(method, route, log)]
+
+    def assert_within(self) -> None:
+        problems = self.problems()
+        if problems:
+            pytest.fail("\n".join(problems), pytrace=False)
+
+
+@contextmanager
+def assert_max_queries(limit: int, threshold: Optional[int] = None) -> Iterator[QueryLog]:
+    with track_queries() as log:
+        yield log
+    problems = []
+    if log.count > limit:
+        problems.append(f"{log.count} SQL-запросов при бюджете {limit}")
+    repeated = log.repeated() if threshold is None else log.repeated(threshold)
+    problems += [f"возможный N+1, {n} раз: {sql[:200]}" for sql, n in repeated.items()]
+    if problems:
+        pytest.fail("\n".join(problems + log.statements), pytrace=False)
+
+
+def assert_all_routes_budgeted(app=None) -> None:
+    if app is None:
+        from app.main import app
+    missing = missing_budgets(app)
+    if missing:
+        pytest.fail("Нет бюджета в QUERY_BUDGETS: " + ", ".join(missing), pytrace=False)
+
+
+@pytest.fixture
+def query_budget() -> Iterator[QueryBudget]:
+    budget = QueryBudget()
+    add_observer(budget)
+    try:
+        yield budget
+    finally:
+        remove_observer(budget)
+    budget.assert_within()
+
+
+@pytest.fixture
+def query_log() -> Iterator[QueryLog]:
+    """Все запросы теста вне HTTP (фоновые задачи, хелперы) — для своих проверок."""
+    with track_queries() as log:
+        yield log
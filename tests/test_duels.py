@@ -0,0 +1,141 @@
+from sqlmodel import update
+
+from app import database
+from app.models import Duel
+
+
+def _clear_lobby(api):
+    """Удалить открытые дуэли других тестов: подбор берёт самую старую из них."""
+    for duel in api.get("/duels/", params={"open_only": True, "limit": 100}).json():
+        assert api.request("DELETE", f"/duels/{duel['id']}").status_code == 200
+
+
+def _full_duel(api):
+    """Дуэль двух новых игроков: (id, (creator_id, заголовки), (join_id, заголовки))."""
+    creator = api.user()
+    joiner = api.user()
+    duel_id = api.post("/duels/", headers=creator[1]).json()["id"]
+    assert api.put(f"/duels/{duel_id}/join", headers=joiner[1]).status_code == 200
+    return duel_id, creator, joiner
+
+
+def _duel_counters(api, headers):
+    stats = api.get("/statistics/", headers=headers).json()
+    return stats["duels"], stats["duels_won"]
+
+
+def test_match_returns_own_open_duel_instead_of_creating_another(api):
+    _clear_lobby(api)
+    user_id, headers = api.user()
+
+    first = api.post("/duels/match", headers=headers)
+    second = api.post("/duels/match", headers=headers)
+
+    assert first.status_code == 201
+    assert second.status_code == 200
+    assert second.json()["id"] == first.json()["id"]
+    own_open = api.get("/duels/", params={"open_only": True, "creator_id": user_id}).json()
+    assert [duel["id"] for duel in own_open] == [first.json()["id"]]
+
+
+def test_match_joins_another_players_open_duel(api):
+    _clear_lobby(api)
+    creator_id, creator = api.user()
+    joiner_id, joiner = api.user()
+    duel_id = api.post("/duels/match", headers=creator).json()["id"]
+
+    response = api.post("/duels/match", headers=joiner)
+
+    assert response.status_code == 200
+    assert response.json()["id"] == duel_id
+    assert response.json()["creator_id"] == creator_id
+    assert response.json()["join_id"] == joiner_id
+    assert response.json()["status"] == "active"
+
+
+def test_result_updates_both_players_counters(api):
+    duel_id, (creator_id, creator), (joiner_id, joiner) = _full_duel(api)
+
+    response = api.post(f"/duels/{duel_id}/result", json={"winner_id": joiner_id}, headers=creator)
+
+    assert response.status_code == 200
+    assert response.json()["winner_id"] == joiner_id
+    assert response.json()["status"] == "finished"
+    assert _duel_counters(api, joiner) == (1, 1)
+    assert _duel_counters(api, creator) == (1, 0)
+
+
+def test_result_for_missing_duel_is_404(api):
+    _, headers = api.user()
+    response = api.post("/duels/999999/result", json={"winner_id": 1}, headers=headers)
+    assert response.status_code == 404
+
+
+def test_result_from_outsider_is_403(api):
+    duel_id, (creator_id, creator), _ = _full_duel(api)
+    _, outsider = api.user()
+
+    response = api.post(f"/duels/{duel_id}/result", json={"winner_id": creator_id}, headers=outsider)
+
+    assert response.status_code == 403
+    assert _duel_counters(api, creator) == (0, 0)
+
+
+def test_result_of_duel_without_opponent_is_400(api):
+    creator_id, creator = api.user()
+    duel_id = api.post("/duels/", headers=creator).json()["id"]
+
+    response = api.post(f"/duels/{duel_id}/result", json={"winner_id": creator_id}, headers=creator)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Duel is not full yet"
+
+
+def test_result_with_outsider_winner_is_400(api):
+    duel_id, (_, creator), (_, joiner) = _full_duel(api)
+    outsider_id, _ = api.user()
+
+    response = api.post(f"/duels/{duel_id}/result", json={"winner_id": outsider_id}, headers=creator)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Winner must be a duel participant"
+    assert _duel_counters(api, creator) == _duel_counters(api, joiner) == (0, 0)
+
+
+def test_result_of_duel_against_yourself_is_400(api):
+    creator_id, creator = api.user()
+    duel_id = api.post("/duels/", headers=creator).json()["id"]
+
+    async def join_self():
+        # Через API такую дуэль не собрать — только старые строки в БД
+        async with database.async_session_maker() as session:
+            await session.exec(update(Duel).where(Duel.id == duel_id).values(join_id=creator_id))
+            await session.commit()
+
+    api.run(join_self())
+    response = api.post(f"/duels/{duel_id}/result", json={"winner_id": creator_id}, headers=creator)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Winner and loser must be different players"
+    assert _duel_counters(api, creator) == (0, 0)
+
+
+def test_second_result_is_409_and_counts_once(api):
+    duel_id, (creator_id, creator), (joiner_id, joiner) = _full_duel(api)
+    assert api.post(f"/duels/{duel_id}/result", json={"winner_id": creator_id}, headers=creator).status_code == 200
+
+    response = api.post(f"/duels/{duel_id}/result", json={"winner_id": joiner_id}, headers=joiner)
+
+    assert response.status_code == 409
+    assert _duel_counters(api, creator) == (1, 1)
+    assert _duel_counters(api, joiner) == (1, 0)
+
+
+def test_join_own_duel_is_400(api):
+    _, creator = api.user()
+    duel_id = api.post("/duels/", headers=creator).json()["id"]
+
+    response = api.put(f"/duels/{duel_id}/join", headers=creator)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot join your own duel"
@@ -0,0 +1,82 @@
+from app import import_users
+from app.database import create_sync_engine
+from app.import_users import import_batch, normalize_record, valid_records
+
+
+class RecordingPool:
+    """Вместо ProcessPoolExecutor: хэширует в процессе и запоминает, что хэшировалось."""
+
+    def __init__(self):
+        self.hashed = []
+
+    def map(self, func, items, chunksize=1):
+        self.hashed.extend(items)
+        return [func(item) for item in items]
+
+
+def _write_csv(tmp_path, text):
+    path = tmp_path / "users.csv"
+    path.write_text(text, encoding="utf-8")
+    return str(path)
+
+
+def test_email_is_normalized_like_register(api):
+    records = [{"email": "  Import.John@Example.COM ", "password": "secret-password"}]
+    engine = create_sync_engine()
+    with engine.begin() as conn:
+        assert import_batch(conn, list(valid_records(records, print)), RecordingPool()) == 1
+
+    response = api.post("/auth/login", json={"email": "Import.John@example.com", "password": "secret-password"})
+    assert response.status_code == 200
+    response = api.post("/auth/login", json={"email": "Import.John@EXAMPLE.com", "password": "secret-password"})
+    assert response.status_code == 200
+
+
+def test_rerun_does_not_rehash_existing_users(api):
+    records = [
+        {"email": "import-rerun1@example.com", "password": "pw-1"},
+        {"email": "import-rerun2@example.com", "password": "pw-2", "games": "3", "games_won": "1"},
+    ]
+    engine = create_sync_engine()
+    first, second = RecordingPool(), RecordingPool()
+    with engine.begin() as conn:
+        assert import_batch(conn, list(valid_records(records, print)), first) == 2
+    with engine.begin() as conn:
+        assert import_batch(conn, list(valid_records(records, print)), second) == 0
+
+    assert sorted(first.hashed) == ["pw-1", "pw-2"]
+    assert second.hashed == []
+
+
+def test_bad_records_are_skipped_and_reported(tmp_path, capsys, api):
+    path = _write_csv(tmp_path, "\n".join([
+        "email,password,games",
+        "import-good@example.com,pw,2",
+        ",pw,1",
+        "not-an-email,pw,1",
+        "import-nopass@example.com,,1",
+        "import-badgames@example.com,pw,many",
+    ]) + "\n")
+
+    assert import_users.main([path]) == 0
+
+    out, err = capsys.readouterr()
+    assert "1 новых пользователей из 1 записей, пропущено некорректных: 4" in out
+    for number in (2, 3, 4, 5):
+        assert f"Запись {number} пропущена" in err
+    response = api.post("/auth/login", json={"email": "import-good@example.com", "password": "pw"})
+    assert response.status_code == 200
+
+
+def test_csv_without_password_column_does_not_abort():
+    records = [{"email": "import-only@example.com", "games": "1"}]
+    errors = []
+
+    assert list(valid_records(records, lambda number, reason: errors.append((number, reason)))) == []
+    assert errors == [(1, "нет password или hashed_password для import-only@example.com")]
+
+
+def test_hashed_password_is_kept():
+    record = normalize_record({"email": "import-hash@example.com", "hashed_password": "$pbkdf2$x"})
+    assert record["hashed_password"] == "$pbkdf2$x"
+    assert "password" not in record
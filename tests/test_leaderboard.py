@@ -0,0 +1,25 @@
+from app import database, leaderboard
+from app.leaderboard import LeaderboardService
+
+
+def test_rebuild_streams_statistics_into_boards(api, monkeypatch):
+    monkeypatch.setattr(leaderboard, "LEADERBOARD_LOAD_BATCH", 2)
+    monkeypatch.setattr(leaderboard, "LEADERBOARD_MIN_GAMES", 3)
+    players = []
+    for wins, losses in ((3, 0), (1, 2), (2, 0)):
+        user_id, headers = api.user()
+        for won in [True] * wins + [False] * losses:
+            api.post("/statistics/game", headers=headers, json={"won": won})
+        players.append(user_id)
+    strong, weak, short = players
+
+    service = LeaderboardService(session_maker=database.async_session_maker)
+    api.run(service.rebuild())
+
+    games = service.boards["games"]
+    assert games.rank(strong)[0] < games.rank(short)[0] < games.rank(weak)[0]
+    assert leaderboard.key_score(games.rank(strong)[1]) == 3
+    winrate = service.boards["winrate"]
+    assert winrate.rank(strong)[0] < winrate.rank(weak)[0]
+    # Меньше LEADERBOARD_MIN_GAMES игр — нет в рейтинге по доле побед
+    assert winrate.rank(short) is None
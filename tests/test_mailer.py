@@ -0,0 +1,124 @@
+import asyncio
+import socket
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app import mailer
+from app.mailer import EmailJob, SMTPOutbox
+
+
+class RecordingHandler:
+    """Локальный SMTP-сервер: запоминает письма, первые fail_first попыток DATA отклоняет."""
+
+    def __init__(self, fail_first: int = 0):
+        self.fail_first = fail_first
+        self.attempts = 0
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.attempts += 1
+        if self.attempts <= self.fail_first:
+            return "451 Try again later"
+        self.sessions.add(id(session))
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 OK"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_server(request):
+    handler = RecordingHandler(**getattr(request, "param", {}))
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller
+    controller.stop()
+
+
+@pytest.fixture(autouse=True)
+def fast_outbox(monkeypatch):
+    monkeypatch.setattr(mailer, "SMTP_BATCH_WAIT", 0.05)
+    monkeypatch.setattr(mailer, "SMTP_RETRY_BASE", 0.05)
+    monkeypatch.setattr(mailer, "SMTP_MAX_ATTEMPTS", 3)
+
+
+def _outbox(controller) -> SMTPOutbox:
+    return SMTPOutbox(host=controller.hostname, port=controller.port, user=None, password=None,
+                      sender="noreply@example.com", starttls=False)
+
+
+def _record_delays(outbox: SMTPOutbox, monkeypatch) -> list:
+    delays = []
+    requeue_later = outbox._requeue_later
+
+    async def recording(job, delay):
+        delays.append(delay)
+        await requeue_later(job, delay)
+
+    monkeypatch.setattr(outbox, "_requeue_later", recording)
+    return delays
+
+
+def test_batch_is_sent_over_one_connection(smtp_server):
+    async def scenario():
+        outbox = _outbox(smtp_server)
+        outbox.start()
+        for i in range(mailer.SMTP_BATCH_SIZE + 5):
+            outbox.enqueue(EmailJob(to=f"user{i}@example.com", subject="Подтверждение", body="code"))
+        await outbox.stop()
+        return outbox
+
+    outbox = asyncio.run(scenario())
+
+    handler = smtp_server.handler
+    assert outbox.sent == mailer.SMTP_BATCH_SIZE + 5
+    assert outbox.failed == 0
+    assert sorted(rcpt for (rcpt,), _ in handler.messages) == sorted(
+        f"user{i}@example.com" for i in range(mailer.SMTP_BATCH_SIZE + 5))
+    assert len(handler.sessions) == 1
+
+
+@pytest.mark.parametrize("smtp_server", [{"fail_first": 2}], indirect=True)
+def test_failed_send_is_retried_with_backoff(smtp_server, monkeypatch):
+    async def scenario():
+        outbox = _outbox(smtp_server)
+        delays = _record_delays(outbox, monkeypatch)
+        outbox.start()
+        outbox.enqueue(EmailJob(to="user@example.com", subject="Подтверждение", body="code"))
+        while not smtp_server.handler.messages:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        return outbox, delays
+
+    outbox, delays = asyncio.run(scenario())
+
+    assert delays == [mailer.SMTP_RETRY_BASE, mailer.SMTP_RETRY_BASE * 2]
+    assert smtp_server.handler.attempts == 3
+    assert outbox.sent == 1
+    assert outbox.failed == 0
+
+
+@pytest.mark.parametrize("smtp_server", [{"fail_first": 100}], indirect=True)
+def test_email_is_dropped_after_max_attempts(smtp_server, monkeypatch):
+    async def scenario():
+        outbox = _outbox(smtp_server)
+        delays = _record_delays(outbox, monkeypatch)
+        outbox.start()
+        outbox.enqueue(EmailJob(to="user@example.com", subject="Подтверждение", body="code"))
+        while not outbox.failed:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        return outbox, delays
+
+    outbox, delays = asyncio.run(scenario())
+
+    assert len(delays) == mailer.SMTP_MAX_ATTEMPTS - 1
+    assert smtp_server.handler.attempts == mailer.SMTP_MAX_ATTEMPTS
+    assert outbox.sent == 0
+    assert outbox.failed == 1
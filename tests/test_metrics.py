@@ -0,0 +1,58 @@
+import asyncio
+
+from app.main import app
+from app.metrics import HTTP_EVENT_STREAMS, HTTP_IN_FLIGHT, HTTP_LATENCY
+
+ROUTE = "/duels/events"
+
+
+def _latency(method: str, route: str):
+    """(число наблюдений, сумма секунд) гистограммы задержки для маршрута."""
+    counts, total = HTTP_LATENCY._values.get((method, route), [[0], 0.0])
+    return sum(counts), total
+
+
+def test_event_stream_is_not_counted_as_in_flight_request(api):
+    async def scenario():
+        disconnect = asyncio.Event()
+        started = asyncio.Event()
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                started.set()
+
+        scope = {
+            "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+            "path": ROUTE, "raw_path": ROUTE.encode(), "root_path": "", "query_string": b"",
+            "headers": [], "server": ("test", 80), "client": ("test", 1),
+        }
+        in_flight = HTTP_IN_FLIGHT._values.get((), 0)
+        observed, observed_total = _latency("GET", ROUTE)
+
+        stream = asyncio.create_task(app(scope, receive, send))
+        await started.wait()
+        await asyncio.sleep(0.3)
+        during = (HTTP_IN_FLIGHT._values.get((), 0) - in_flight, HTTP_EVENT_STREAMS._values.get((ROUTE,)))
+        disconnect.set()
+        await stream
+
+        count, total = _latency("GET", ROUTE)
+        after = (HTTP_IN_FLIGHT._values.get((), 0) - in_flight, HTTP_EVENT_STREAMS._values.get((ROUTE,)))
+        return during, after, count - observed, total - observed_total
+
+    during, after, observations, latency_total = api.run(scenario())
+
+    assert during == (0, 1)
+    assert after == (0, 0)
+    # Задержка — до начала ответа, а не всё время жизни потока
+    assert observations == 1
+    assert latency_total < 0.3
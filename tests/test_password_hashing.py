@@ -0,0 +1,39 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app import utils
+
+
+@pytest.fixture
+def process_pool(monkeypatch):
+    monkeypatch.setattr(utils, "HASH_WORKERS", 1)
+    utils.shutdown_hash_executor()
+    yield
+    utils.shutdown_hash_executor()
+
+
+def _break_pool(get_executor=utils._get_hash_executor) -> ProcessPoolExecutor:
+    executor = get_executor()
+    with pytest.raises(BrokenProcessPool):
+        executor.submit(os._exit, 1).result()
+    return executor
+
+
+def test_broken_pool_is_recreated(process_pool):
+    broken = _break_pool()
+
+    hashed = asyncio.run(utils.hash_password_async("secret-password"))
+
+    assert utils.verify_password("secret-password", hashed)
+    assert utils._hash_executor is not broken
+
+
+def test_pool_broken_twice_answers_busy(process_pool, monkeypatch):
+    get_executor = utils._get_hash_executor
+    monkeypatch.setattr(utils, "_get_hash_executor", lambda: _break_pool(get_executor))
+    with pytest.raises(utils.PasswordHashBusy):
+        asyncio.run(utils.hash_password_async("secret-password"))
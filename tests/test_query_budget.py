@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+import httpx
+from sqlalchemy import delete, update
+
+from app import database
+from app.cache import user_cache
+from app.main import app
+from app.models import Duel, User
+from app.query_budget import QUERY_BUDGETS
+from tests.query_budget_plugin import assert_all_routes_budgeted
+from app.utils import create_verification_token, hash_verification_token
+
+PASSWORD = "secret-password"
+
+
+async def _sse_status(path: str) -> int:
+    """Открыть SSE-поток и сразу отключиться: ASGITransport ждёт конца тела, а поток бесконечный."""
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await asyncio.sleep(0.05)
+        return {"type": "http.disconnect"}
+
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": path, "raw_path": path.encode(), "root_path": "", "query_string": b"",
+        "headers": [], "server": ("test", 80), "client": ("test", 1),
+    }
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+async def _set_user(email: str, **values) -> None:
+    async with database.async_session_maker() as session:
+        await session.exec(update(User).where(User.email == email).values(**values))
+        await session.commit()
+
+
+async def _clear_lobby() -> None:
+    async with database.async_session_maker() as session:
+        await session.exec(delete(Duel).where(Duel.join_id == None))  # noqa: E711
+        await session.commit()
+
+
+async def _call_every_route(client: httpx.AsyncClient) -> None:
+    async def call(method, url, expected=(200,), **kwargs):
+        # Промах кэша пользователей — худший случай для бюджета
+        user_cache.clear()
+        response = await client.request(method, url, **kwargs)
+        assert response.status_code in expected, (method, url, response.text)
+        return response
+
+    async def login(email):
+        response = await call("POST", "/auth/login", json={"email": email, "password": PASSWORD})
+        return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+    for email in ("admin@example.com", "player@example.com"):
+        await call("POST", "/auth/register", json={"email": email, "password": PASSWORD})
+    token, expires = create_verification_token()
+    await _set_user("admin@example.com", verification_token_hash=hash_verification_token(token),
+                    verification_expire=expires)
+    await call("GET", "/auth/verify", params={"token": token})
+    admin, player = await login("admin@example.com"), await login("player@example.com")
+    admin_id = (await call("GET", "/auth/me", headers=admin)).json()["id"]
+
+    duel_id = (await call("POST", "/duels/", headers=admin)).json()["id"]
+    await call("PUT", f"/duels/{duel_id}/join", headers=player)
+    await call("POST", f"/duels/{duel_id}/result", json={"winner_id": admin_id}, headers=admin)
+    # Без открытых дуэлей других тестов подбор идёт по самому дорогому пути — созданию
+    await _clear_lobby()
+    match_id = (await call("POST", "/duels/match", expected=(201,), headers=admin)).json()["id"]
+    await call("POST", "/duels/match", headers=player)
+    await call("GET", "/duels/")
+    await call("DELETE", f"/duels/{match_id}")
+    assert await _sse_status("/duels/events") == 200
+    assert await _sse_status(f"/duels/{duel_id}/events") == 200
+
+    await call("POST", "/statistics/game", json={"won": True}, headers=admin)
+    await call("POST", "/statistics/duel", json={"won": False}, headers=admin)
+    await call("POST", "/statistics/batch", headers=admin, json={"results": [
+        {"id": "r1", "type": "game", "won": True},
+        {"id": "r2", "type": "duel", "won": False},
+    ]})
+    await call("GET", "/statistics/", headers=admin)
+    await call("GET", "/statistics/leaderboard", params={"board": "games"}, headers=admin)
+    await call("GET", "/statistics/rank", params={"board": "games"}, headers=admin)
+
+    await call("GET", "/metrics")
+    await call("GET", "/internal/pool", headers={"X-Internal-Token": os.environ["INTERNAL_TOKEN"]})
+    await call("GET", "/health/live")
+    await call("GET", "/health/ready")
+    await call("GET", "/admin/export/duels", headers=admin)
+
+
+def test_every_route_within_query_budget(api, query_budget):
+    api.run(_call_every_route(api.client))
+
+    called = {(method, route) for method, route, _ in query_budget.requests}
+    assert called == set(QUERY_BUDGETS), set(QUERY_BUDGETS) ^ called
+    assert_all_routes_budgeted()
@@ -0,0 +1,57 @@
+from app.routers import statistics
+
+
+def _batch(*items):
+    return {"results": [{"id": id_, "type": type_, "won": won} for id_, type_, won in items]}
+
+
+def test_duplicate_ids_within_batch_are_applied_once(api):
+    _, headers = api.user()
+
+    response = api.post("/statistics/batch", headers=headers, json=_batch(
+        ("r1", "game", True), ("r1", "game", True), ("r2", "duel", False),
+    ))
+
+    assert response.status_code == 200
+    body = response.json()
+    assert (body["applied"], body["duplicates"]) == (2, 1)
+    assert (body["games"], body["games_won"], body["duels"], body["duels_won"]) == (1, 1, 1, 0)
+
+
+def test_resent_batch_is_not_applied_again(api):
+    _, headers = api.user()
+    batch = _batch(("r1", "game", True), ("r2", "game", False), ("r3", "duel", True))
+
+    first = api.post("/statistics/batch", headers=headers, json=batch).json()
+    second = api.post("/statistics/batch", headers=headers, json=batch).json()
+
+    assert (first["applied"], first["duplicates"]) == (3, 0)
+    assert (second["applied"], second["duplicates"]) == (0, 3)
+    counters = ("games", "games_won", "duels", "duels_won")
+    assert [second[key] for key in counters] == [first[key] for key in counters] == [2, 1, 1, 1]
+    stored = api.get("/statistics/", headers=headers).json()
+    assert [stored[key] for key in counters] == [2, 1, 1, 1]
+
+
+def test_ids_are_scoped_per_user(api):
+    _, first_user = api.user()
+    _, second_user = api.user()
+    batch = _batch(("shared", "game", True))
+
+    api.post("/statistics/batch", headers=first_user, json=batch)
+    response = api.post("/statistics/batch", headers=second_user, json=batch).json()
+
+    assert response["applied"] == 1
+
+
+def test_batch_over_limit_is_rejected(api, monkeypatch):
+    monkeypatch.setattr(statistics, "STATISTICS_BATCH_MAX", 2)
+    _, headers = api.user()
+
+    response = api.post("/statistics/batch", headers=headers, json=_batch(
+        ("r1", "game", True), ("r2", "game", True), ("r3", "game", True),
+    ))
+
+    assert response.status_code == 413
+    stored = api.get("/statistics/", headers=headers).json()
+    assert stored["games"] == 0
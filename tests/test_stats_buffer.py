@@ -0,0 +1,104 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlmodel import select
+
+from app import database
+from app.models import Statistics
+from app.routers import statistics
+from app.stats_buffer import StatisticsBuffer
+
+
+class SlowCommit:
+    """Фабрика сессий, чей commit ждёт release: окно «UPSERT выполнен, но не закоммичен»."""
+
+    def __init__(self):
+        self.committing = asyncio.Event()
+        self.release = asyncio.Event()
+
+    @asynccontextmanager
+    async def __call__(self):
+        async with database.async_session_maker() as session:
+            commit = session.commit
+
+            async def delayed_commit():
+                self.committing.set()
+                await self.release.wait()
+                await commit()
+
+            session.commit = delayed_commit
+            yield session
+
+
+@pytest.fixture
+def write_behind(monkeypatch):
+    """Включить write-behind для роутера статистики с отдельным буфером теста."""
+    buffer = StatisticsBuffer(interval=3600)
+    monkeypatch.setattr(statistics, "STATS_WRITE_BEHIND", True)
+    monkeypatch.setattr(statistics, "stats_buffer", buffer)
+    return buffer
+
+
+async def _stored_games(user_id: int) -> int:
+    async with database.async_session_maker() as session:
+        stats = (await session.exec(select(Statistics).where(Statistics.user_id == user_id))).first()
+        return stats.games if stats else 0
+
+
+def test_read_during_flush_includes_flushing_deltas(api, write_behind):
+    user_id, headers = api.user()
+    for _ in range(5):
+        api.post("/statistics/game", headers=headers, json={"won": True})
+    assert api.get("/statistics/", headers=headers).json()["games"] == 5
+
+    async def scenario():
+        slow = SlowCommit()
+        write_behind.session_maker = slow
+        flush = asyncio.create_task(write_behind.flush())
+        await slow.committing.wait()
+        during = await api.client.get("/statistics/", headers=headers)
+        slow.release.set()
+        await flush
+        after = await api.client.get("/statistics/", headers=headers)
+        return during, after
+
+    during, after = api.run(scenario())
+
+    assert during.json()["games"] == 5
+    assert after.json()["games"] == 5
+    assert api.run(_stored_games(user_id)) == 5
+    assert write_behind.pending(user_id)["games"] == 0
+
+
+def test_failed_flush_keeps_deltas(api, write_behind):
+    user_id, headers = api.user()
+    api.post("/statistics/game", headers=headers, json={"won": False})
+
+    @asynccontextmanager
+    async def broken_session():
+        raise RuntimeError("db down")
+        yield
+
+    write_behind.session_maker = broken_session
+    with pytest.raises(RuntimeError):
+        api.run(write_behind.flush())
+
+    assert write_behind.pending(user_id)["games"] == 1
+    assert api.get("/statistics/", headers=headers).json()["games"] == 1
+
+
+def test_stop_flushes_pending_deltas(api, write_behind):
+    user_id, headers = api.user()
+
+    async def scenario():
+        write_behind.start()
+        for _ in range(3):
+            await api.client.post("/statistics/game", headers=headers, json={"won": True})
+        stored_before = await _stored_games(user_id)
+        await write_behind.stop()
+        return stored_before
+
+    assert api.run(scenario()) == 0
+    assert api.run(_stored_games(user_id)) == 3
+    assert write_behind.pending(user_id)["games"] == 0